@@ -1,9 +1,202 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import threading
 import time
 import sys
-from golf_assistant import GolfAssistant
+import json
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from golf_assistant import MISSING_DISTANCE, OFF_TOPIC, GolfAssistant
+from golf_sessions import GestorSesiones
+
+# Cada cuánto (ms) el hilo principal vacía la cola de actualizaciones de la UI
+INTERVALO_COLA_UI_MS = 50
+
+# Id de la única conversación que atiende la ventana
+ID_SESION_LOCAL = "local"
+
+# Mensajes que se mantienen en el widget del chat; los más antiguos se quitan
+# del widget pero siguen en el historial
+MAX_MENSAJES_VISIBLES = 500
+
+# Pausa de escritura (ms) tras la que se analiza el texto completo de la entrada
+RETARDO_VISTA_PREVIA_MS = 150
+
+# Tiempo máximo (ms) que la vista previa puede ocupar el hilo de Tk por tecla,
+# para no perder fotogramas a 60 Hz
+PRESUPUESTO_FRAME_MS = 16
+
+# ============================================
+# VISTA PREVIA MIENTRAS SE ESCRIBE
+# ============================================
+
+class VistaPrevia:
+    """
+    Vista previa de la recomendación mientras el usuario escribe,
+    independiente de Tk.
+    En cada tecla solo se analiza el prefijo de palabras ya completas, y solo
+    con la caché y el camino rápido del asistente: mientras se escribe una
+    palabra el prefijo no cambia y se reutiliza el resultado sin trabajo
+    alguno. Tras una pausa se analiza el texto completo; si necesita Spacy, el
+    análisis va a un hilo aparte y su resultado se descarta si el texto cambió
+    mientras tanto (los trabajos aún en cola se cancelan).
+    """
+    
+    def __init__(self, assistant, executor, publicar):
+        """
+        Args:
+            assistant (GolfAssistant): Asistente con el que analizar
+            executor (Executor): Hilo donde se hace el análisis con Spacy
+            publicar (callable): publicar(version, resultado) con el resultado de
+                un análisis en segundo plano (se llama desde ese hilo)
+        """
+        self.assistant = assistant
+        self.executor = executor
+        self.publicar = publicar
+        # Versión del texto: cambia con cada tecla y cada análisis la lleva consigo
+        self.version = 0
+        self._prefijo = None
+        self._trabajo = None
+        # Contadores: prefijos analizados al momento, prefijos reutilizados,
+        # análisis en segundo plano, descartados por obsoletos, y el mayor
+        # tiempo ocupado en el hilo de la interfaz
+        self.inmediatas = 0
+        self.reutilizadas = 0
+        self.en_segundo_plano = 0
+        self.descartadas = 0
+        self.max_ms = 0.0
+        self.sobre_presupuesto = 0
+    
+    def tecla(self, texto):
+        """
+        Llamar en el hilo de la interfaz cada vez que cambia el texto.
+        Devuelve el resultado para el prefijo de palabras completas, o None si
+        no hay nada nuevo que mostrar.
+        """
+        inicio = time.perf_counter()
+        self.cancelar()
+        texto = texto.lower()
+        corte = texto.rfind(" ")
+        prefijo = texto[:corte].strip() if corte > 0 else ""
+        resultado = None
+        if prefijo == self._prefijo:
+            self.reutilizadas += 1
+        else:
+            self._prefijo = prefijo
+            if prefijo:
+                resultado = self.assistant.preview(prefijo)
+                self.inmediatas += 1
+        self._medir(inicio)
+        return resultado
+    
+    def pausa(self, texto):
+        """
+        Llamar en el hilo de la interfaz cuando el usuario deja de escribir.
+        Devuelve el resultado del texto completo si se obtiene al momento; si
+        no, lo analiza en segundo plano (llegará por publicar) y devuelve None.
+        """
+        inicio = time.perf_counter()
+        self.cancelar()
+        texto = texto.strip().lower()
+        resultado = None
+        if texto:
+            resultado = self.assistant.preview(texto)
+            if resultado is None:
+                self.en_segundo_plano += 1
+                self._trabajo = self.executor.submit(self._analizar, self.version, texto)
+        self._medir(inicio)
+        return resultado
+    
+    def limpiar(self):
+        """La entrada quedó vacía: cancelar y olvidar el último prefijo"""
+        self.cancelar()
+        self._prefijo = None
+    
+    def cancelar(self):
+        """Invalida los análisis en curso y cancela el que aún esté en cola"""
+        self.version += 1
+        if self._trabajo is not None:
+            if self._trabajo.cancel():
+                self.descartadas += 1
+            self._trabajo = None
+    
+    def _analizar(self, version, texto):
+        # Se ejecuta en el hilo de trabajo; el texto puede haber cambiado ya
+        if version != self.version:
+            self.descartadas += 1
+            return
+        resultado = self.assistant.preview(texto, full=True)
+        if version != self.version:
+            self.descartadas += 1
+            return
+        self.publicar(version, resultado)
+    
+    def _medir(self, inicio):
+        ms = (time.perf_counter() - inicio) * 1000
+        if ms > self.max_ms:
+            self.max_ms = ms
+        if ms > PRESUPUESTO_FRAME_MS:
+            self.sobre_presupuesto += 1
+    
+    def estadisticas(self):
+        """Contadores de la vista previa"""
+        return {
+            'inmediatas': self.inmediatas,
+            'reutilizadas': self.reutilizadas,
+            'en_segundo_plano': self.en_segundo_plano,
+            'descartadas': self.descartadas,
+            'max_ms': self.max_ms,
+            'sobre_presupuesto': self.sobre_presupuesto,
+        }
+    
+    @staticmethod
+    def describir(resultado):
+        """Texto corto de la vista previa a partir del resultado estructurado"""
+        if resultado is None or resultado.reason_id == OFF_TOPIC:
+            return ""
+        if resultado.reason_id == MISSING_DISTANCE:
+            return "✏️ Indica la distancia al hoyo para ver una recomendación"
+        partes = [f"👀 Vista previa: {resultado.club}", f"{resultado.distance} yardas"]
+        if resultado.terrain != "desconocido":
+            partes.append(resultado.terrain)
+        if resultado.elevation != "plano":
+            partes.append(resultado.elevation)
+        return " · ".join(partes)
+
+# ============================================
+# HISTORIAL DE LA CONVERSACIÓN
+# ============================================
+
+class HistorialChat:
+    """
+    Historial completo de la conversación, independiente del widget del chat.
+    Cada mensaje se guarda como una tupla compacta (hora, tipo, mensaje,
+    resultados). Si se indica un archivo, los mensajes se añaden también en
+    formato JSON lines con una sola escritura por lote.
+    """
+    
+    def __init__(self, archivo=None, max_en_memoria=None):
+        """
+        Args:
+            archivo (str): Ruta del archivo JSON lines, o None para no guardar en disco
+            max_en_memoria (int): Máximo de mensajes en memoria (None = sin límite)
+        """
+        self.archivo = archivo
+        self.mensajes = deque(maxlen=max_en_memoria)
+    
+    def agregar_lote(self, registros):
+        """Guardar una lista de tuplas (hora, tipo, mensaje, resultados)"""
+        self.mensajes.extend(registros)
+        if self.archivo:
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.writelines(
+                    json.dumps({'hora': hora, 'tipo': tipo, 'mensaje': mensaje,
+                                'resultados': resultados}, ensure_ascii=False) + "\n"
+                    for hora, tipo, mensaje, resultados in registros
+                )
+    
+    def __len__(self):
+        return len(self.mensajes)
 
 # ============================================
 # CLASE PRINCIPAL DE LA INTERFAZ GRÁFICA
@@ -14,13 +207,42 @@ class ChatNicoGUI:
     Clase principal que maneja la interfaz gráfica del Asistente de Golf
     """
     
-    def __init__(self):
-        """Inicializar la aplicación"""
-        # Variables de estado del chat
-        self.saludado = False
-        
-        # Inicializar el asistente de golf
-        self.assistant = GolfAssistant()
+    def __init__(self, max_mensajes_visibles=MAX_MENSAJES_VISIBLES, archivo_historial=None,
+                 archivo_eventos=None):
+        """
+        Inicializar la aplicación
+        Args:
+            max_mensajes_visibles (int): Mensajes que se mantienen en el widget del chat
+            archivo_historial (str): Archivo JSON lines donde guardar la conversación
+            archivo_eventos (str): Archivo JSON lines donde registrar cada mensaje
+                con sus características, el palo y las latencias (ver golf_events)
+        """
+        # Historial completo y líneas que ocupa cada mensaje visible en el widget
+        self.historial = HistorialChat(archivo_historial)
+        self.max_mensajes_visibles = max_mensajes_visibles
+        self.lineas_visibles = deque()
+        
+        # Inicializar el asistente de golf y el estado de la conversación
+        self.assistant = GolfAssistant(event_log=archivo_eventos)
+        # Una sola conversación local, que no caduca por inactividad
+        self.sesiones = GestorSesiones(self.assistant, inactividad=None)
+        
+        # Un único hilo de trabajo procesa los mensajes en orden, sin crear
+        # un hilo nuevo por cada mensaje
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chatnico")
+        
+        # Vista previa mientras se escribe, con su propio hilo para que el
+        # análisis de un texto a medias no retrase los mensajes enviados
+        self.executor_vista_previa = ThreadPoolExecutor(max_workers=1,
+                                                        thread_name_prefix="chatnico-vista")
+        self.vista_previa = VistaPrevia(
+            self.assistant, self.executor_vista_previa,
+            lambda version, resultado: self.cola_ui.put(('vista_previa', (version, resultado))))
+        self._id_pausa = None
+        
+        # Cola de actualizaciones de la UI: el hilo de trabajo solo produce
+        # resultados y el hilo principal de Tk es el único que toca los widgets
+        self.cola_ui = queue.Queue()
         
         # Configurar ventana principal
         self.root = tk.Tk()
@@ -47,6 +269,9 @@ class ChatNicoGUI:
         
         # Configurar el comportamiento al cerrar
         self.root.protocol("WM_DELETE_WINDOW", self.cerrar_aplicacion)
+        
+        # Empezar a vaciar la cola de actualizaciones desde el bucle de Tk
+        self.root.after(INTERVALO_COLA_UI_MS, self.drenar_cola_ui)
     
     def configurar_estilos(self):
         """Configurar estilos personalizados para ttk"""
@@ -145,8 +370,10 @@ class ChatNicoGUI:
         input_frame.pack(fill='x', pady=(0,15))
         
         # Campo de texto para entrada
+        self.texto_entrada = tk.StringVar()
         self.entrada = tk.Entry(
             input_frame,
+            textvariable=self.texto_entrada,
             font=('Segoe UI', 12),
             bg=self.colores['blanco'],
             fg=self.colores['texto_oscuro'],
@@ -168,6 +395,18 @@ class ChatNicoGUI:
         # Permitir enviar con Enter
         self.entrada.bind('<Return>', lambda e: self.enviar_mensaje())
         self.entrada.focus_set()
+        
+        # Vista previa de la recomendación mientras se escribe
+        self.etiqueta_vista_previa = tk.Label(
+            self.chat_area.master,
+            text="",
+            anchor='w',
+            font=('Segoe UI', 10, 'italic'),
+            bg=self.colores['bg_principal'],
+            fg=self.colores['verde_oscuro']
+        )
+        self.etiqueta_vista_previa.pack(fill='x')
+        self.texto_entrada.trace_add('write', self.al_cambiar_entrada)
     
     def crear_barra_estado(self):
         """Crear la barra de estado en la parte inferior"""
@@ -229,37 +468,114 @@ class ChatNicoGUI:
     
     def agregar_mensaje(self, mensaje, tipo='bot', resultados=None):
         """
-        Agregar un mensaje al área de chat
+        Agregar un mensaje al área de chat (solo desde el hilo principal)
         Args:
             mensaje (str): Mensaje a mostrar
             tipo (str): 'user' o 'bot'
             resultados (list): Lista de resultados a mostrar
         """
-        self.chat_area.config(state=tk.NORMAL)
-        
+        self.agregar_mensajes([(mensaje, tipo, resultados)])
+    
+    def agregar_mensajes(self, lote):
+        """
+        Agregar varios mensajes al área de chat en una sola pasada.
+        Todo el lote se inserta con una sola llamada al widget, se quitan del
+        widget los mensajes que superen max_mensajes_visibles (siguen en el
+        historial) y se hace scroll una sola vez.
+        Args:
+            lote (list): Tuplas (mensaje, tipo, resultados) como en agregar_mensaje
+        """
         # Agregar timestamp
         timestamp = time.strftime("%H:%M")
         
-        if tipo == 'user':
-            # Mensaje del usuario
-            self.chat_area.insert(tk.END, f"[{timestamp}] Tú: {mensaje}\n", 'user_message')
-        else:
-            # Mensaje del bot
-            self.chat_area.insert(tk.END, f"[{timestamp}] 🤖 ChatNico: {mensaje}\n", 'bot_message')
+        # Pares (texto, estilo) de todo el lote para un único insert
+        segmentos = []
+        for mensaje, tipo, resultados in lote:
+            inicio = len(segmentos)
+            if tipo == 'user':
+                # Mensaje del usuario
+                segmentos += [f"[{timestamp}] Tú: {mensaje}\n", 'user_message']
+            else:
+                # Mensaje del bot
+                segmentos += [f"[{timestamp}] 🤖 ChatNico: {mensaje}\n", 'bot_message']
+                
+                # Si hay resultados, mostrarlos
+                if resultados:
+                    segmentos += ["\n📊 Resultados del procesamiento:\n", 'titulo_resultado']
+                    for i, resultado in enumerate(resultados, 1):
+                        segmentos += [f"   {i:2d}. {resultado}\n", 'resultado']
+            
+            # Agregar separación entre mensajes
+            segmentos += ["\n", ()]
             
-            # Si hay resultados, mostrarlos
-            if resultados:
-                self.chat_area.insert(tk.END, "\n📊 Resultados del procesamiento:\n", 'titulo_resultado')
-                for i, resultado in enumerate(resultados, 1):
-                    self.chat_area.insert(tk.END, f"   {i:2d}. {resultado}\n", 'resultado')
-        
-        # Agregar separación entre mensajes
-        self.chat_area.insert(tk.END, "\n")
+            # Recordar cuántas líneas ocupa el mensaje para poder recortarlo luego
+            self.lineas_visibles.append(sum(texto.count("\n") for texto in segmentos[inicio::2]))
+        
+        self.historial.agregar_lote([(timestamp, tipo, mensaje, resultados)
+                                     for mensaje, tipo, resultados in lote])
+        
+        self.chat_area.config(state=tk.NORMAL)
+        self.chat_area.insert(tk.END, *segmentos)
+        
+        # Quitar del widget los mensajes más antiguos por encima del límite
+        lineas_sobrantes = 0
+        while len(self.lineas_visibles) > self.max_mensajes_visibles:
+            lineas_sobrantes += self.lineas_visibles.popleft()
+        if lineas_sobrantes:
+            self.chat_area.delete("1.0", f"{lineas_sobrantes + 1}.0")
+        
         self.chat_area.config(state=tk.DISABLED)
         
-        # Hacer scroll hacia abajo
+        # Hacer scroll hacia abajo una sola vez por lote
         self.chat_area.see(tk.END)
     
+    def publicar_mensaje(self, mensaje, tipo='bot', resultados=None):
+        """Encolar un mensaje para el chat (seguro desde cualquier hilo)"""
+        self.cola_ui.put(('mensaje', (mensaje, tipo, resultados)))
+    
+    def publicar_status(self, texto):
+        """Encolar un cambio de la barra de estado (seguro desde cualquier hilo)"""
+        self.cola_ui.put(('status', texto))
+    
+    def drenar_cola_ui(self):
+        """
+        Vaciar la cola de actualizaciones en el hilo principal.
+        Los mensajes acumulados se pintan juntos en una sola pasada y de los
+        cambios de estado solo se aplica el último.
+        Se vuelve a programar aunque falle al pintar (por ejemplo, un TclError),
+        para que la interfaz no deje de actualizarse.
+        """
+        lote = []
+        status = None
+        cerrar = False
+        try:
+            try:
+                while True:
+                    accion, dato = self.cola_ui.get_nowait()
+                    if accion == 'mensaje':
+                        lote.append(dato)
+                    elif accion == 'status':
+                        status = dato
+                    elif accion == 'vista_previa':
+                        version, resultado = dato
+                        # Solo si el texto no ha cambiado desde que se pidió
+                        if version == self.vista_previa.version:
+                            self.mostrar_vista_previa(resultado)
+                    elif accion == 'cerrar':
+                        cerrar = True
+            except queue.Empty:
+                pass
+            
+            if lote:
+                self.agregar_mensajes(lote)
+            if status is not None:
+                self.actualizar_status(status)
+        finally:
+            if cerrar:
+                self.root.after(1000, self.cerrar_aplicacion)
+            else:
+                self.root.after(INTERVALO_COLA_UI_MS, self.drenar_cola_ui)
+    
     def mostrar_mensaje_inicial(self):
         """Mostrar el mensaje de bienvenida del asistente de golf"""
         mensaje = """🏌️‍♂️ ¡Bienvenido a tu Asistente de Golf Personal! ⛳
@@ -278,9 +594,37 @@ Puedes contarme tu situación de juego de forma natural, por ejemplo:
         self.agregar_mensaje(mensaje, 'sistema')
     
     def actualizar_status(self, texto):
-        """Actualizar el mensaje en la barra de estado"""
+        """Actualizar el mensaje en la barra de estado (solo desde el hilo principal)"""
         self.status_label.config(text=texto)
-        self.root.update_idletasks()
+    
+    def al_cambiar_entrada(self, *args):
+        """
+        Cada cambio del texto de la entrada: vista previa inmediata del prefijo
+        ya escrito y análisis completo cuando el usuario hace una pausa
+        """
+        if self._id_pausa is not None:
+            self.root.after_cancel(self._id_pausa)
+            self._id_pausa = None
+        texto = self.entrada.get()
+        if not texto.strip():
+            self.vista_previa.limpiar()
+            self.mostrar_vista_previa(None)
+            return
+        resultado = self.vista_previa.tecla(texto)
+        if resultado is not None:
+            self.mostrar_vista_previa(resultado)
+        self._id_pausa = self.root.after(RETARDO_VISTA_PREVIA_MS, self.al_pausar_entrada)
+    
+    def al_pausar_entrada(self):
+        """El usuario dejó de escribir: vista previa del texto completo"""
+        self._id_pausa = None
+        resultado = self.vista_previa.pausa(self.entrada.get())
+        if resultado is not None:
+            self.mostrar_vista_previa(resultado)
+    
+    def mostrar_vista_previa(self, resultado):
+        """Mostrar (o borrar, con None) la vista previa bajo la entrada"""
+        self.etiqueta_vista_previa.config(text=VistaPrevia.describir(resultado))
     
     def enviar_mensaje(self):
         """Procesar el envío de un mensaje"""
@@ -296,48 +640,33 @@ Puedes contarme tu situación de juego de forma natural, por ejemplo:
         # Mostrar el mensaje del usuario
         self.agregar_mensaje(mensaje, 'user')
         
-        # Procesar el mensaje en un hilo separado para no bloquear la UI
-        thread = threading.Thread(target=self.procesar_mensaje, args=(mensaje.lower(),))
-        thread.daemon = True
-        thread.start()
+        # Procesar el mensaje en el hilo de trabajo para no bloquear la UI
+        self.executor.submit(self.procesar_mensaje, mensaje.lower())
     
     def procesar_mensaje(self, mensaje):
         """
-        Procesar el mensaje del usuario y generar una recomendación de golf
+        Procesar el mensaje del usuario y generar una recomendación de golf.
+        Se ejecuta en el hilo de trabajo: no toca los widgets, solo publica
+        los resultados en la cola de la UI.
         Args:
             mensaje (str): Mensaje del usuario
         """
         # Actualizar estado
-        self.actualizar_status("⛳ Analizando tu situación de juego...")
+        self.publicar_status("⛳ Analizando tu situación de juego...")
         
         try:
-            # Comandos de salida
-            saludos_despedida = ['salir', 'adiós', 'adios', 'chao', 'hasta luego', 'gracias', 'bye']
-            if any(saludo in mensaje.lower() for saludo in saludos_despedida):
-                self.agregar_mensaje("¡Hasta luego! Que tengas un excelente juego. ¡Swing fácil! 🏌️‍♂️")
-                if 'salir' in mensaje.lower() or 'chao' in mensaje.lower() or 'bye' in mensaje.lower():
-                    self.root.after(1000, self.cerrar_aplicacion)
-                return
-                
-            # Si es un saludo inicial
-            if not self.saludado:
-                if any(palabra in mensaje.lower() for palabra in ['hola', 'buenos días', 'buenas tardes', 'buenas noches', 'hey', 'holi']):
-                    self.saludado = True
-                    self.agregar_mensaje("¡Hola! Soy tu asistente de golf personal. Estoy aquí para ayudarte a elegir el palo adecuado para tu siguiente golpe.\n\nPuedes decirme cosas como:\n• 'Estoy a 150 yardas del hoyo en el fairway'\n• 'Tengo 90 yardas hasta el green con viento en contra'\n• 'Estoy en el rough a 120 yardas'")
-                else:
-                    self.agregar_mensaje("¡Hola! Soy tu asistente de golf. Por favor, saludame y cuentame que necesitas. 😊")
-                return
-                
-            # Procesar la entrada con el asistente de golf
-            respuesta = self.assistant.process_input(mensaje)
-            self.agregar_mensaje(respuesta)
+            # Saludos, despedidas y recomendaciones según el estado de la conversación
+            respuesta = self.sesiones.procesar_mensaje(ID_SESION_LOCAL, mensaje)
+            self.publicar_mensaje(respuesta.mensaje)
+            if respuesta.cerrar:
+                self.cola_ui.put(('cerrar', None))
                 
         except Exception as e:
-            self.agregar_mensaje(f"❌ Lo siento, hubo un error al procesar tu consulta. Asegúrate de incluir la distancia y el terreno.\n\nEjemplo: 'Estoy a 150 yardas en el fairway'")
+            self.publicar_mensaje(f"❌ Lo siento, hubo un error al procesar tu consulta. Asegúrate de incluir la distancia y el terreno.\n\nEjemplo: 'Estoy a 150 yardas en el fairway'")
             print(f"Error: {str(e)}")
             
         finally:
-            self.actualizar_status("🟢 Listo para ayudarte")
+            self.publicar_status("🟢 Listo para ayudarte")
     
     def procesar_texto_usuario(self, texto):
         """
@@ -345,24 +674,28 @@ Puedes contarme tu situación de juego de forma natural, por ejemplo:
         Args:
             texto (str): Texto a procesar
         """
-        self.actualizar_status("⛳ Analizando tu situación de juego...")
+        self.publicar_status("⛳ Analizando tu situación de juego...")
         time.sleep(0.5)  # Pequeña pausa para feedback visual
         
         try:
             # Procesar la entrada con el asistente de golf
             respuesta = self.assistant.process_input(texto)
-            self.agregar_mensaje(respuesta)
+            self.publicar_mensaje(respuesta)
         
         except Exception as e:
-            self.agregar_mensaje(f"❌ Error inesperado: {str(e)}")
+            self.publicar_mensaje(f"❌ Error inesperado: {str(e)}")
             print(f"Error en procesamiento: {e}")  # Para debug
         
         # Resetear estado
         self.esperando_frase = None
-        self.actualizar_status("🟢 Asistente de Golf listo para ayudarte")
+        self.publicar_status("🟢 Asistente de Golf listo para ayudarte")
     
     def cerrar_aplicacion(self):
         """Cerrar la aplicación de forma segura"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.vista_previa.cancelar()
+        self.executor_vista_previa.shutdown(wait=False, cancel_futures=True)
+        self.assistant.close()
         try:
             self.root.quit()
             self.root.destroy()
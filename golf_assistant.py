@@ -1,207 +1,1953 @@
+import numpy as np
 import spacy
+from spacy.lang.es.lex_attrs import like_num
+from spacy.language import Language
 import re
+import os
+import asyncio
+import glob
+import hashlib
+import json
+import threading
+import time
+import zipfile
+from bisect import bisect_left
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 
-class GolfAssistant:
-    def __init__(self):
-        # Cargar el modelo de español de Spacy
-        try:
-            self.nlp = spacy.load("es_core_news_sm")
-        except OSError:
-            # Si el modelo no está instalado, intentar instalarlo
-            import subprocess
-            import sys
-            subprocess.check_call([sys.executable, "-m", "spacy", "download", "es_core_news_sm"])
-            self.nlp = spacy.load("es_core_news_sm")
-            
-        # Definir rangos de distancia para cada palo (en yardas)
-        self.club_ranges = {
-            "Driver": (200, 280),
-            "Madera 3": (180, 230),
-            "Madera 5": (170, 220),
-            "Hierro 3": (160, 210),
-            "Hierro 4": (150, 200),
-            "Hierro 5": (140, 180),
-            "Hierro 6": (130, 170),
-            "Hierro 7": (120, 160),
-            "Hierro 8": (110, 150),
-            "Hierro 9": (100, 140),
-            "Pitching Wedge (PW)": (80, 120),
-            "Sand Wedge (SW)": (60, 100),
-            "Lob Wedge (LW)": (40, 80),
-            "Putter": (0, 40)
+from golf_cache import DiskFeatureCache
+from golf_events import EventLog
+from golf_metrics import Metrics, profile_call, prometheus_text
+
+# Modelo de español que usa el asistente
+MODEL_NAME = "es_core_news_sm"
+
+# Respuestas fijas cuando no se puede recomendar un palo
+OFF_TOPIC_RESPONSE = (
+    "Lo siento, solo puedo ayudarte con recomendaciones de golf. "
+    "Puedes preguntarme sobre qué palo usar en cierta distancia o situación en el campo de golf."
+)
+MISSING_DISTANCE_RESPONSE = "Por favor, indícame la distancia al hoyo (por ejemplo, 'Estoy a 150 yardas')."
+
+# Versión de los extractores de características; si cambia cómo se extraen,
+# hay que subirla para que la caché en disco no devuelva resultados antiguos
+FEATURES_VERSION = 3
+
+# Archivo de datos con los rangos de los palos y los léxicos, y variable de
+# entorno para usar otro
+TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golf_tables.json")
+TABLES_FILE_ENV = "GOLF_TABLES_FILE"
+
+# Variable de entorno con el directorio local donde buscar el modelo
+# (carpeta ya descomprimida o wheel descargado previamente)
+MODEL_DIR_ENV = "GOLF_SPACY_MODEL_DIR"
+
+# Componentes del modelo que se excluyen según el modo de carga.
+# "fast" deja solo lo que usan los extractores (tokenizer, morphologizer y
+# lemmatizer); "parser" añade el análisis de dependencias para extract_elevation.
+PIPELINE_EXCLUDES = {
+    "fast": ["parser", "ner"],
+    "parser": ["ner"],
+    "full": [],
+}
+
+
+class ModelNotFoundError(OSError):
+    """El modelo de Spacy no está disponible sin acceder a la red"""
+
+
+class AssistantOverloadedError(RuntimeError):
+    """Hay demasiadas peticiones pendientes y la nueva se rechaza"""
+
+
+def _find_model_dir(path):
+    """Devuelve la carpeta con config.cfg dentro de path (o en su subcarpeta versionada)"""
+    if os.path.isfile(os.path.join(path, "config.cfg")):
+        return path
+    # Estructura de un paquete instalado: es_core_news_sm/es_core_news_sm-3.x.x/
+    nested = sorted(glob.glob(os.path.join(path, "*", "config.cfg")))
+    return os.path.dirname(nested[-1]) if nested else None
+
+
+def resolve_model(name=MODEL_NAME, model_dir=None):
+    """
+    Localiza el modelo de Spacy sin descargar nada.
+    Busca, en este orden:
+    - En model_dir (o en la variable de entorno GOLF_SPACY_MODEL_DIR) una carpeta
+      con el modelo o un wheel "<name>-*.whl", que se descomprime allí mismo.
+    - El paquete instalado en el entorno de Python.
+    Devuelve la ruta o el nombre que hay que pasar a spacy.load y lanza
+    ModelNotFoundError si el modelo no está disponible.
+    """
+    model_dir = model_dir or os.environ.get(MODEL_DIR_ENV)
+    if model_dir:
+        for candidate in (model_dir, os.path.join(model_dir, name)):
+            if os.path.isdir(candidate):
+                found = _find_model_dir(candidate)
+                if found:
+                    return found
+
+        wheels = sorted(glob.glob(os.path.join(model_dir, f"{name}-*.whl")))
+        if wheels:
+            target = os.path.join(model_dir, name)
+            try:
+                with zipfile.ZipFile(wheels[-1]) as wheel:
+                    members = [m for m in wheel.namelist() if m.startswith(f"{name}/")]
+                    wheel.extractall(model_dir, members)
+            except (OSError, zipfile.BadZipFile) as e:
+                raise ModelNotFoundError(f"No se pudo descomprimir {wheels[-1]}: {e}") from e
+            found = _find_model_dir(target)
+            if found:
+                return found
+
+    if spacy.util.is_package(name):
+        return name
+
+    raise ModelNotFoundError(
+        f"No se encontró el modelo de Spacy '{name}'. Instálalo con "
+        f"'python -m spacy download {name}' o indica una carpeta local con el "
+        f"modelo o su wheel en {MODEL_DIR_ENV}."
+    )
+
+
+# Formas frecuentes que el lematizador por reglas resuelve directamente
+_RULE_LEMMAS = {
+    "estoy": "estar", "estás": "estar", "está": "estar", "estamos": "estar",
+    "están": "estar", "estaba": "estar", "estaban": "estar",
+    "soy": "ser", "es": "ser", "somos": "ser", "son": "ser",
+    "tengo": "tener", "tienes": "tener", "tiene": "tener", "tenemos": "tener",
+    "tienen": "tener", "voy": "ir", "va": "ir", "vamos": "ir", "van": "ir",
+    "encuentro": "encontrar", "encuentra": "encontrar", "encuentran": "encontrar",
+}
+
+# Verbos regulares relevantes para los extractores y sus terminaciones
+_RULE_VERBS = ("subir", "bajar", "ascender", "descender", "quedar", "faltar",
+               "comprar", "vender", "pagar", "costar", "golfear")
+_RULE_ENDINGS = {
+    "ar": ("o", "as", "a", "amos", "an", "ando", "ado", "é", "ó", "aba", "aban"),
+    "er": ("o", "es", "e", "emos", "en", "iendo", "ido", "í", "ió", "ía", "ían"),
+    "ir": ("o", "es", "e", "imos", "en", "iendo", "ido", "í", "ió", "ía", "ían"),
+}
+for _verb in _RULE_VERBS:
+    for _ending in _RULE_ENDINGS[_verb[-2:]]:
+        _RULE_LEMMAS.setdefault(_verb[:-2] + _ending, _verb)
+
+
+def rule_lemma(word):
+    """Lema aproximado de una palabra en minúsculas, sin modelo estadístico"""
+    if word in _RULE_LEMMAS:
+        return _RULE_LEMMAS[word]
+    # Plurales regulares terminados en vocal + s ("yardas" -> "yarda")
+    if len(word) > 3 and word[-1] == "s" and word[-2] in "aeiou":
+        return word[:-1]
+    return word
+
+
+class GolfRuleLemmatizer:
+    """
+    Componente de Spacy que asigna lemas con rule_lemma. Las palabras de
+    `keep` (las de los léxicos de las tablas) se dejan tal cual: sin etiquetas
+    gramaticales las reglas confundirían "costo" con "costar" o "pesos" con
+    "peso" y el mensaje dejaría de coincidir con su término.
+    """
+
+    def __init__(self, keep=()):
+        self.keep = frozenset(keep)
+
+    def __call__(self, doc):
+        keep = self.keep
+        for token in doc:
+            word = token.lower_
+            token.lemma_ = word if word in keep else rule_lemma(word)
+        return doc
+
+
+@Language.factory("golf_rule_lemmatizer", default_config={"keep": []})
+def make_golf_rule_lemmatizer(nlp, name, keep):
+    return GolfRuleLemmatizer(keep)
+
+
+def lexicon_words(tables):
+    """Palabras de los términos de terreno, elevación, golf y comercio de las tablas"""
+    terms = list(tables.golf_terms) + list(tables.commerce_terms)
+    for synonyms in tables.terrain_synonyms.values():
+        terms += synonyms
+    for elevation_terms in tables.elevation_terms.values():
+        terms += elevation_terms
+    return sorted({word for term in terms for word in term.lower().split()})
+
+
+def build_blank_pipeline(keep=()):
+    """
+    Pipeline mínimo de respaldo: spacy.blank("es") con lematizador por reglas,
+    que no toca las palabras de `keep` (normalmente lexicon_words(tables))
+    """
+    nlp = spacy.blank("es")
+    nlp.add_pipe("golf_rule_lemmatizer", config={"keep": list(keep)})
+    return nlp
+
+
+# Números escritos con palabras y su valor. "ciento" y "cien" valen 100; los
+# números compuestos se suman ("ciento cincuenta", "treinta y cinco") y "mil"
+# multiplica lo anterior ("dos mil quinientos")
+SPANISH_NUMBER_WORDS = {
+    "cero": 0, "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4,
+    "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
+    "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
+    "dieciséis": 16, "dieciseis": 16, "diecisiete": 17, "dieciocho": 18,
+    "diecinueve": 19, "veinte": 20, "veintiún": 21, "veintiuno": 21,
+    "veintiuna": 21, "veintidós": 22, "veintidos": 22, "veintitrés": 23,
+    "veintitres": 23, "veinticuatro": 24, "veinticinco": 25, "veintiséis": 26,
+    "veintiseis": 26, "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
+    "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60,
+    "setenta": 70, "ochenta": 80, "noventa": 90, "cien": 100, "ciento": 100,
+    "doscientos": 200, "doscientas": 200, "trescientos": 300, "trescientas": 300,
+    "cuatrocientos": 400, "cuatrocientas": 400, "quinientos": 500,
+    "quinientas": 500, "seiscientos": 600, "seiscientas": 600,
+    "setecientos": 700, "setecientas": 700, "ochocientos": 800,
+    "ochocientas": 800, "novecientos": 900, "novecientas": 900, "mil": 1000,
+}
+
+# Palabras de número que Spacy marca como like_num, para que el camino rápido
+# marque los mismos tokens como números
+LIKE_NUM_WORDS = frozenset(word for word in SPANISH_NUMBER_WORDS if like_num(word))
+
+# Unidades de distancia reconocidas tras un número escrito con palabras; las
+# distancias en metros se convierten a yardas, que es la unidad de los palos
+YARD_UNITS = frozenset(["yardas", "yarda", "yds", "yd", "y"])
+METRE_UNITS = frozenset(["metros", "metro", "mts", "mt", "m"])
+YARDS_PER_METRE = 1.0936133
+
+# Número seguido de unidad, para los textos que el recorrido por tokens no resuelve
+DISTANCE_RE = re.compile(r'(\d+)\s*(yardas|metros|mts?|y)', re.IGNORECASE)
+
+
+def parse_spanish_number(tokens, start=0):
+    """
+    Lee el número escrito con palabras que empieza en tokens[start], en una
+    sola pasada ("ciento cincuenta", "treinta y cinco", "dos mil quinientos").
+    Devuelve (valor, índice del primer token tras el número), o (None, start)
+    si tokens[start] no es un número.
+    """
+    total = current = 0
+    last = None  # Último componente: "unit" (0-29), "ten", "hundred" o "thousand"
+    i = end = start
+    size = len(tokens)
+    while i < size:
+        value = SPANISH_NUMBER_WORDS.get(tokens[i])
+        if value is None:
+            # "y" solo une decenas y unidades: "treinta y cinco"
+            if (tokens[i] == "y" and last == "ten" and i + 1 < size
+                    and SPANISH_NUMBER_WORDS.get(tokens[i + 1], 10) < 10):
+                i += 1
+                last = "and"
+                continue
+            break
+        if value == 1000:
+            if last == "thousand":
+                break
+            total += (current or 1) * 1000
+            current = 0
+            last = "thousand"
+        elif value >= 100:
+            if last not in (None, "thousand"):
+                break
+            current += value
+            last = "hundred"
+        elif value >= 30:
+            if last not in (None, "thousand", "hundred"):
+                break
+            current += value
+            last = "ten"
+        else:
+            if last not in (None, "thousand", "hundred", "and"):
+                break
+            current += value
+            last = "unit"
+        i += 1
+        end = i
+    if end == start:
+        return None, start
+    return total + current, end
+
+
+def to_yards(distance, unit):
+    """Distancia en yardas (redondeada) si la unidad es de metros; si no, la misma"""
+    if unit in METRE_UNITS:
+        return round(distance * YARDS_PER_METRE)
+    return distance
+
+
+# Vocabulario del camino rápido: palabras frecuentes en descripciones de golpes
+# cuyo lema en es_core_news_sm no depende del contexto. Un mensaje formado solo
+# por estas palabras, números y signos de puntuación se analiza sin Spacy.
+FAST_PATH_LEMMAS = {
+    # Artículos, preposiciones y otras palabras de enlace
+    "a": "a", "al": "al", "el": "el", "la": "el", "los": "el", "las": "el",
+    "de": "de", "del": "del", "en": "en", "con": "con", "desde": "desde",
+    "hasta": "hasta", "hacia": "hacia", "y": "y", "o": "o", "mi": "mi",
+    "me": "yo", "un": "uno", "una": "uno", "unas": "uno", "unos": "uno",
+    "más": "más", "menos": "menos", "sin": "sin",
+    "aproximadamente": "aproximadamente", "cerca": "cerca", "contra": "contra",
+    # Números escritos con palabras (los de lema estable en es_core_news_sm)
+    "cero": "cero", "uno": "uno", "dos": "dos", "tres": "tres", "cuatro": "cuatro",
+    "cinco": "cinco", "seis": "seis", "siete": "siete", "ocho": "ocho",
+    "nueve": "nueve", "diez": "diez", "once": "once", "doce": "doce",
+    "trece": "trece", "catorce": "catorce", "quince": "quince",
+    "dieciséis": "dieciséis", "dieciseis": "dieciseis", "diecisiete": "diecisiete",
+    "dieciocho": "dieciocho", "diecinueve": "diecinueve", "veinte": "veinte",
+    "veintiún": "veintiún", "veintiuno": "veintiuno", "veintidós": "veintidós",
+    "veintidos": "veintido", "veintitrés": "veintitrés", "veintitres": "veintitr",
+    "veinticuatro": "veinticuatro", "veinticinco": "veinticinco",
+    "veintiséis": "veintiséis", "veintiseis": "veintiseis", "veintiocho": "veintiocho",
+    "treinta": "treinta", "cuarenta": "cuarenta", "cincuenta": "cincuenta",
+    "sesenta": "sesenta", "setenta": "setenta", "ochenta": "ochenta",
+    "noventa": "noventa", "cien": "cien", "ciento": "ciento",
+    "doscientas": "doscientos", "cuatrocientos": "cuatrociento",
+    "cuatrocientas": "cuatrocienta", "seiscientos": "seisciento",
+    "setecientas": "setecienta", "novecientos": "noveciento",
+    "novecientas": "novecienta", "mil": "mil",
+    # Verbos habituales
+    "estoy": "estar", "está": "estar", "estamos": "estar", "tengo": "tener",
+    "queda": "quedar", "quedan": "quedar", "falta": "faltar", "faltan": "faltar",
+    "subiendo": "subir", "bajando": "bajar", "cuesta": "costar",
+    # Unidades
+    "yardas": "yarda", "yarda": "yarda", "metros": "metro", "metro": "metro", "m": "m",
+    "mts": "mts", "distancia": "distancia",
+    # Campo, terreno y elevación
+    "bola": "bola", "tiro": "tiro", "golpe": "golpe", "campo": "campo",
+    "palo": "palo", "hierro": "hierro", "driver": "driver",
+    "viento": "viento", "terreno": "terreno", "fairway": "fairway", "calle": "calle",
+    "pista": "pista", "rough": "rough", "hierba": "hierba", "maleza": "maleza",
+    "pasto": "pasto", "césped": "césped", "alto": "alto", "alta": "alto",
+    "bunker": "bunker", "trampa": "trampa", "arena": "arena", "arenero": "arenero",
+    "tee": "tee", "salida": "salida", "punto": "punto", "green": "green",
+    "verde": "verde", "bandera": "bandera", "hoyo": "hoyo", "arriba": "arriba",
+    "abajo": "abajo", "subida": "subida", "bajada": "bajada", "plano": "plano",
+    "llano": "llano", "nivel": "nivel",
+    # Puntuación que Spacy separa siempre como token propio
+    ".": ".", ",": ",", ";": ";", ":": ":", "!": "!", "?": "?", "¿": "¿", "¡": "¡",
+}
+
+# Separa palabras y signos de puntuación como lo hace el tokenizador de Spacy,
+# incluido el número pegado a la unidad en "100m"
+FAST_TOKEN_RE = re.compile(r"[.,;:!?¿¡]|\d+(?=m(?:[\s.,;:!?¿¡]|$))|[^\s.,;:!?¿¡]+")
+
+# Textos que el tokenizador rápido no reproduciría igual que Spacy: espacios
+# repetidos o en los extremos, tabuladores, números decimales y abreviaturas
+# de una letra ("m.")
+FAST_PATH_REJECT_RE = re.compile(r"^\s|\s$|\s\s|[^\S ]|\d[.,]\d|(?<![^\W\d_])[^\W\d_]\.")
+
+
+def _fast_message(text):
+    """
+    ParsedMessage del texto sin Spacy si todas sus palabras están en
+    FAST_PATH_LEMMAS o son números; None si no
+    """
+    lowered = text.lower()
+    if FAST_PATH_REJECT_RE.search(lowered):
+        return None
+    tokens = FAST_TOKEN_RE.findall(lowered)
+    lemmas = [token if token.isdigit() else FAST_PATH_LEMMAS.get(token) for token in tokens]
+    if not tokens or None in lemmas:
+        return None
+    numbers = [token.isdigit() or token in LIKE_NUM_WORDS for token in tokens]
+    return ParsedMessage(lowered, tokens, numbers, lemmas)
+
+
+def _current_rss_kb():
+    """Memoria residente actual del proceso en KB, o None si no se puede medir"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Características de un golpe extraídas de un mensaje. Si el mensaje no es de
+# golf, o no indica la distancia, los campos siguientes quedan en None.
+ShotFeatures = namedtuple("ShotFeatures", ["golf", "distance", "terrain", "elevation"])
+
+# Identificadores de las razones de un resultado: los de REASON_TEMPLATES
+# cuando hay recomendación y estos dos cuando no la hay
+OFF_TOPIC = "off_topic"
+MISSING_DISTANCE = "missing_distance"
+
+# Plantillas de la razón de cada recomendación ({club} es el palo)
+REASON_TEMPLATES = {
+    "no_club": "Lo siento, no pude determinar una recomendación adecuada.",
+    "bunker": "Recomiendo el Sand Wedge para salir del bunker con facilidad.",
+    "rough": "Un hierro 5 es una buena opción para salir del rough con distancia.",
+    "green": "Usa el putter para rodar la pelota hacia el hoyo.",
+    "tee": "El driver es ideal para el tee de salida en distancias largas.",
+    "fairway": "El {club} es adecuado para esta distancia desde el fairway.",
+    "default": "Puedes usar el {club} para esta distancia.",
+}
+
+# Palo que se indica cuando ningún rango contiene la distancia
+UNDETERMINED_CLUB = "No se pudo determinar"
+
+# Confianza de una recomendación: total si el mensaje indica el terreno,
+# menor si se supuso, y nula si no se encontró palo
+CONFIDENCE_KNOWN_TERRAIN = 1.0
+CONFIDENCE_UNKNOWN_TERRAIN = 0.75
+CONFIDENCE_NO_CLUB = 0.0
+
+
+class RecommendationText(str):
+    """
+    Respuesta en texto de process_input: un str corriente, compatible con
+    quien espera texto, que además lleva el Recommendation en .result para
+    no tener que volver a leer el palo del texto
+    """
+
+
+class Recommendation:
+    """
+    Resultado inmutable de procesar un mensaje: palo, identificador de la
+    razón (ver REASON_TEMPLATES, OFF_TOPIC y MISSING_DISTANCE), distancia,
+    distancia ajustada por la elevación, terreno, elevación y confianza.
+    La razón y la respuesta en texto solo se generan la primera vez que se
+    piden y se guardan, así que los resultados en caché no vuelven a
+    formatearlas; to_dict(text=False) serializa sin generarlas.
+    """
+
+    __slots__ = ("club", "reason_id", "distance", "adjusted_distance", "terrain", "elevation",
+                 "confidence", "_reason", "_message")
+
+    def __init__(self, club, reason_id, distance=None, adjusted_distance=None, terrain=None,
+                 elevation=None, confidence=None):
+        set_ = object.__setattr__
+        set_(self, "club", club)
+        set_(self, "reason_id", reason_id)
+        set_(self, "distance", distance)
+        set_(self, "adjusted_distance", adjusted_distance)
+        set_(self, "terrain", terrain)
+        set_(self, "elevation", elevation)
+        set_(self, "confidence", confidence)
+        set_(self, "_reason", None)
+        set_(self, "_message", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Recommendation es inmutable")
+
+    def __reduce__(self):
+        return (Recommendation, (self.club, self.reason_id, self.distance, self.adjusted_distance,
+                                 self.terrain, self.elevation, self.confidence))
+
+    def __repr__(self):
+        return (f"Recommendation(club={self.club!r}, reason_id={self.reason_id!r}, "
+                f"distance={self.distance!r}, adjusted_distance={self.adjusted_distance!r}, "
+                f"terrain={self.terrain!r}, elevation={self.elevation!r}, "
+                f"confidence={self.confidence!r})")
+
+    def __str__(self):
+        return self.message
+
+    @property
+    def golf(self):
+        """Si el mensaje era de golf"""
+        return self.reason_id != OFF_TOPIC
+
+    @property
+    def reason(self):
+        """Razón de la recomendación, o None si no hay recomendación"""
+        reason = self._reason
+        if reason is None:
+            template = REASON_TEMPLATES.get(self.reason_id)
+            if template is None:
+                return None
+            reason = template.format(club=self.club)
+            object.__setattr__(self, "_reason", reason)
+        return reason
+
+    @property
+    def message(self):
+        """Respuesta en texto para el usuario (RecommendationText)"""
+        message = self._message
+        if message is None:
+            if self.reason_id == OFF_TOPIC:
+                message = RecommendationText(OFF_TOPIC_RESPONSE)
+            elif self.reason_id == MISSING_DISTANCE:
+                message = RecommendationText(MISSING_DISTANCE_RESPONSE)
+            else:
+                message = RecommendationText(f"Recomendación: {self.club}\n\nRazón: {self.reason}")
+            message.result = self
+            object.__setattr__(self, "_message", message)
+        return message
+
+    def to_dict(self, text=True):
+        """
+        Diccionario listo para JSON: golf, distance, terrain, elevation, club,
+        reason y message (como el de GolfAssistant.recommend) más
+        adjusted_distance, reason_id y confidence. Con text=False se omiten
+        reason y message, sin generar ningún texto.
+        """
+        data = {
+            "golf": self.reason_id != OFF_TOPIC,
+            "distance": self.distance,
+            "terrain": self.terrain,
+            "elevation": self.elevation,
+            "club": self.club,
         }
-        
-        # Diccionario de sinónimos para términos de golf
-        self.terrain_synonyms = {
-            "fairway": ["fairway", "calle", "callejón", "pista"],
-            "rough": ["rough", "hierba", "maleza", "pasto", "césped alto"],
-            "bunker": ["bunker", "trampa de arena", "arena", "arenero", "trampa"],
-            "tee": ["tee", "salida", "punto de salida", "lanzamiento"],
-            "green": ["green", "verde", "copa", "bandera", "hoyo"]
+        if text:
+            data["reason"] = self.reason
+            data["message"] = self.message
+        data["adjusted_distance"] = self.adjusted_distance
+        data["reason_id"] = self.reason_id
+        data["confidence"] = self.confidence
+        return data
+
+
+# Resultados de los mensajes sin recomendación, compartidos
+OFF_TOPIC_RESULT = Recommendation(None, OFF_TOPIC)
+MISSING_DISTANCE_RESULT = Recommendation(None, MISSING_DISTANCE)
+
+
+class LRUCache:
+    """
+    Caché LRU acotada y segura entre hilos, con caducidad opcional (ttl en
+    segundos). Lleva la cuenta de aciertos, fallos, expulsiones y caducados.
+    Con maxsize=0 no guarda nada.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Valor guardado para key, o default si no está o ya caducó"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Como get, pero sin contar el acceso ni cambiar el orden de expulsión"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > self._clock():
+                return value
+        return default
+
+    def put(self, key, value):
+        """Guarda value y expulsa las entradas menos usadas si se supera maxsize"""
+        if self.maxsize <= 0:
+            return
+        expires = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Tamaño, límites y contadores de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
         }
-        
-        self.elevation_terms = {
-            "subida": ["subir", "ascender", "arriba", "elevado", "cuesta arriba"],
-            "bajada": ["bajar", "descender", "abajo", "hacia abajo", "cuesta abajo"],
-            "plano": ["plano", "nivel", "igualado", "llano"]
+
+
+class ParsedMessage:
+    """
+    Mensaje del usuario analizado una sola vez.
+    Guarda los tokens, cuáles parecen números, los lemas, el texto de lemas unido
+    y los bigramas, para que todos los extractores trabajen sobre el mismo análisis.
+    doc es el Doc de Spacy, o None si el mensaje se resolvió por el camino rápido.
+    """
+
+    __slots__ = ("text", "doc", "tokens", "numbers", "lemmas", "lemma_text", "bigrams",
+                 "labels")
+
+    def __init__(self, text, tokens, numbers, lemmas, doc=None):
+        self.text = text
+        self.doc = doc
+        self.tokens = tokens
+        self.numbers = numbers
+        self.lemmas = lemmas
+        self.lemma_text = ' '.join(lemmas)
+        self.bigrams = [' '.join(lemmas[i:i+2]) for i in range(len(lemmas)-1)]
+        # Etiquetas del léxico encontradas en lemma_text (las calcula LexiconIndex)
+        self.labels = None
+
+    @classmethod
+    def from_doc(cls, doc):
+        """Crea el mensaje a partir de un Doc de Spacy"""
+        return cls(doc.text,
+                   [token.text for token in doc],
+                   [token.like_num for token in doc],
+                   [token.lemma_ for token in doc],
+                   doc)
+
+
+class KeywordAutomaton:
+    """
+    Autómata de Aho-Corasick sobre un conjunto de palabras clave.
+    Encuentra en una sola pasada sobre el texto todas las palabras clave que
+    aparecen como subcadena, con un coste que no depende de cuántas haya.
+    """
+
+    def __init__(self, keywords):
+        """keywords: iterable de pares (término, etiqueta)"""
+        self._goto = [{}]
+        outputs = [set()]
+        for term, label in keywords:
+            state = 0
+            for char in term:
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto[state][char] = following
+                    self._goto.append({})
+                    outputs.append(set())
+                state = following
+            outputs[state].add(label)
+
+        # Enlaces de fallo en anchura: cada estado hereda las etiquetas del sufijo
+        # más largo que también es prefijo de alguna palabra clave
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(char, 0)
+                outputs[following] |= outputs[self._fail[following]]
+        self._outputs = [frozenset(labels) for labels in outputs]
+
+    def find(self, text):
+        """Devuelve el conjunto de etiquetas de las palabras clave presentes en text"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class LexiconIndex:
+    """
+    Índice de los léxicos de terreno, elevación, golf y comercio.
+    Se construye una vez y clasifica cada mensaje con una sola pasada del
+    autómata sobre los lemas (terreno, golf y comercio, que se buscan como
+    subcadena) y búsquedas en diccionario de unigramas y bigramas (elevación).
+    Cuando varias categorías coinciden gana la primera en el orden del léxico.
+    Los términos de comercio solo cuentan al principio de una palabra, para que
+    "noventa" no se tome por "venta".
+    """
+
+    def __init__(self, terrain_synonyms, elevation_terms, golf_terms, commerce_terms):
+        self.terrains = tuple(terrain_synonyms)
+        self.elevations = tuple(elevation_terms)
+
+        keywords = [(term, "golf") for term in golf_terms]
+        keywords += [(" " + term, "commerce") for term in commerce_terms]
+        for rank, terrain in enumerate(self.terrains):
+            keywords += [(synonym, rank) for synonym in terrain_synonyms[terrain]]
+        self._automaton = KeywordAutomaton(keywords)
+
+        # Término de elevación -> posición de su categoría (la primera si se repite)
+        self._elevation_ranks = {}
+        for rank, elevation in enumerate(self.elevations):
+            for term in elevation_terms[elevation]:
+                self._elevation_ranks.setdefault(term, rank)
+
+    def labels(self, message):
+        """Etiquetas del léxico presentes en el mensaje (se calculan una sola vez)"""
+        if message.labels is None:
+            message.labels = self._automaton.find(" " + message.lemma_text)
+        return message.labels
+
+    def terrain(self, message):
+        """Terreno mencionado en el mensaje, o None"""
+        ranks = [label for label in self.labels(message) if type(label) is int]
+        return self.terrains[min(ranks)] if ranks else None
+
+    def elevation(self, message):
+        """Elevación mencionada en los lemas o bigramas del mensaje, o None"""
+        ranks = self._elevation_ranks
+        found = [ranks[term] for term in message.lemmas if term in ranks]
+        found += [ranks[term] for term in message.bigrams if term in ranks]
+        return self.elevations[min(found)] if found else None
+
+    def is_golf(self, message):
+        return "golf" in self.labels(message)
+
+    def is_commerce(self, message):
+        return "commerce" in self.labels(message)
+
+
+class ClubRangeIndex:
+    """
+    Índice de intervalos sobre los rangos de distancia de los palos.
+    Los extremos de todos los rangos parten la recta en tramos; para cada
+    extremo y cada tramo entre extremos se precalcula el palo que devolvería el
+    recorrido lineal de club_ranges (el primero cuyo rango contiene la distancia).
+    Cada consulta es una búsqueda binaria, O(log n) en el número de palos, y
+    las consultas por lotes se resuelven sobre arrays de NumPy con searchsorted.
+    """
+
+    def __init__(self, club_ranges):
+        items = list(club_ranges.items())
+
+        def first_club(distance):
+            for club, (min_dist, max_dist) in items:
+                if min_dist <= distance <= max_dist:
+                    return club
+            return None
+
+        bounds = sorted({bound for bounds in club_ranges.values() for bound in bounds})
+        # Palo exactamente en cada extremo
+        at_bound = [first_club(bound) for bound in bounds]
+        # Palo en cada tramo abierto: antes del primer extremo, entre dos
+        # consecutivos y después del último
+        inner = [first_club((low + high) / 2) for low, high in zip(bounds, bounds[1:])]
+        between = [None, *inner, None]
+
+        self.bounds = np.array(bounds, dtype=np.int64)
+        self._at_bound = np.array(at_bound, dtype=object)
+        self._between = np.array(between, dtype=object)
+        # Nombres de los palos (None el último) y, para los lotes, el índice
+        # de ese nombre en cada extremo y cada tramo
+        self.names = np.array([*club_ranges, None], dtype=object)
+        ids = {club: i for i, club in enumerate(self.names)}
+        self._at_bound_ids = np.array([ids[club] for club in at_bound], dtype=np.intp)
+        self._between_ids = np.array([ids[club] for club in between], dtype=np.intp)
+        # Las consultas sueltas son más rápidas con bisect sobre tuplas
+        self._scalar = (tuple(bounds), tuple(at_bound), tuple(between))
+
+    def lookup(self, distance):
+        """Palo para la distancia dada, o None si ningún rango la contiene"""
+        bounds, at_bound, between = self._scalar
+        i = bisect_left(bounds, distance)
+        if i < len(bounds) and bounds[i] == distance:
+            return at_bound[i]
+        return between[i]
+
+    def lookup_ids(self, distances):
+        """
+        Versión vectorizada de lookup: (índices, nombres), donde índices es un
+        array con la posición en nombres del palo de cada distancia
+        """
+        return _interval_ids(self.bounds, self._at_bound_ids, self._between_ids,
+                             distances), self.names
+
+    def lookup_many(self, distances):
+        """Versión por lotes de lookup: array de NumPy con el palo (o None) de cada distancia"""
+        ids, names = self.lookup_ids(distances)
+        return names[ids]
+
+
+def _interval_ids(bounds, at_bound, between, distances):
+    """
+    Para cada distancia, at_bound[i] si coincide con el extremo bounds[i] o
+    between[i] si cae en el tramo que termina en él (i como en bisect_left)
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    i = np.searchsorted(bounds, distances)
+    ids = between[i]
+    if len(bounds):
+        j = np.minimum(i, len(bounds) - 1)
+        ids = np.where(bounds[j] == distances, at_bound[j], ids)
+    return ids
+
+
+# Cambios de palo por terreno de _terrain_choice, en su orden de prioridad,
+# para la versión vectorizada de choose_clubs: (razón, palo o None si se
+# mantiene el de la distancia)
+TERRAIN_RULES = (
+    ("no_club", UNDETERMINED_CLUB),
+    ("bunker", "Sand Wedge (SW)"),
+    ("rough", "Hierro 5"),
+    ("green", "Putter"),
+    ("tee", "Driver"),
+    ("fairway", None),
+)
+_RULE_REASONS = np.array([reason for reason, _ in TERRAIN_RULES] + ["default"], dtype=object)
+_RULE_CLUBS = np.array([club for _, club in TERRAIN_RULES] + [None], dtype=object)
+
+# Resultado de choose_clubs: un array de NumPy por campo, un elemento por golpe
+ClubChoices = namedtuple("ClubChoices", ["club", "reason_id", "adjusted_distance", "confidence"])
+
+
+class GolfTables:
+    """
+    Tablas del asistente compiladas a partir de golf_tables.json: rangos de los
+    palos, sinónimos de terreno, términos de elevación, de golf y de comercio,
+    con su ClubRangeIndex y su LexiconIndex. Es inmutable, de modo que se
+    comparte entre asistentes e hilos sin copiarla.
+    tag identifica el contenido (versión y huella) y forma parte de las claves
+    de las cachés.
+    """
+
+    __slots__ = ("version", "digest", "tag", "signature", "club_ranges", "terrain_synonyms",
+                 "elevation_terms", "golf_terms", "commerce_terms", "club_index", "lexicon")
+
+    def __init__(self, data, signature=None):
+        try:
+            version = data["version"]
+            club_ranges = {str(club): (int(low), int(high))
+                           for club, (low, high) in data["club_ranges"].items()}
+            terrain_synonyms = {str(terrain): tuple(map(str, terms))
+                                for terrain, terms in data["terrain_synonyms"].items()}
+            elevation_terms = {str(elevation): tuple(map(str, terms))
+                               for elevation, terms in data["elevation_terms"].items()}
+            golf_terms = tuple(map(str, data["golf_terms"]))
+            commerce_terms = tuple(map(str, data["commerce_terms"]))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Tablas del asistente no válidas: {e!r}") from e
+
+        canonical = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        set_ = object.__setattr__
+        set_(self, "version", version)
+        set_(self, "digest", hashlib.sha1(canonical.encode("utf-8")).hexdigest())
+        set_(self, "tag", f"{version}:{self.digest[:12]}")
+        set_(self, "signature", signature)
+        set_(self, "club_ranges", MappingProxyType(club_ranges))
+        set_(self, "terrain_synonyms", MappingProxyType(terrain_synonyms))
+        set_(self, "elevation_terms", MappingProxyType(elevation_terms))
+        set_(self, "golf_terms", golf_terms)
+        set_(self, "commerce_terms", commerce_terms)
+        set_(self, "club_index", ClubRangeIndex(club_ranges))
+        set_(self, "lexicon", LexiconIndex(terrain_synonyms, elevation_terms,
+                                           golf_terms, commerce_terms))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GolfTables es inmutable")
+
+    @classmethod
+    def from_file(cls, path):
+        """Lee y compila el archivo JSON de tablas"""
+        signature = _file_signature(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), signature)
+
+
+def _file_signature(path):
+    """(mtime, tamaño, inodo) del archivo, para detectar cambios sin leerlo"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class TableStore:
+    """
+    Tablas vigentes de un archivo, con recarga en caliente.
+    Un hilo vigilante comprueba cada check_interval segundos si el archivo
+    cambió y, si es así, lo recompila y sustituye la referencia de una vez.
+    Las peticiones leen `tables` sin bloqueos: las que están en curso siguen con
+    las tablas que ya tenían y nunca esperan a la recarga. Si el archivo nuevo
+    no es válido se conservan las anteriores.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.tables = GolfTables.from_file(path)
+        self._reloading = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        # Firma del último archivo que no se pudo compilar, para no reintentarlo
+        self._failed_signature = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+        self.last_compile_seconds = None
+        self.last_swap_seconds = None
+        self.start_watching()
+
+    def current(self):
+        """Tablas vigentes"""
+        return self.tables
+
+    def start_watching(self):
+        """Arranca el hilo vigilante (si hay intervalo y no está ya en marcha)"""
+        if self.check_interval is None or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="golf-tables", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                signature = _file_signature(self.path)
+            except OSError:
+                continue
+            if signature not in (self.tables.signature, self._failed_signature):
+                self.reload()
+
+    def reload(self):
+        """Recompila el archivo ahora mismo; devuelve True si las tablas se sustituyeron"""
+        with self._reloading:
+            start = time.perf_counter()
+            try:
+                tables = GolfTables.from_file(self.path)
+            except (OSError, ValueError) as e:
+                try:
+                    self._failed_signature = _file_signature(self.path)
+                except OSError:
+                    pass
+                self.reload_errors += 1
+                self.last_error = str(e)
+                return False
+            compiled = time.perf_counter()
+            # Un solo cambio de referencia: cada lector ve las tablas viejas o las nuevas
+            self.tables = tables
+            self.last_swap_seconds = time.perf_counter() - compiled
+            self.last_compile_seconds = compiled - start
+            self.reloads += 1
+            return True
+
+    def stats(self):
+        """Versión vigente y contadores de recargas"""
+        return {
+            "path": self.path,
+            "version": self.tables.version,
+            "tag": self.tables.tag,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "last_compile_seconds": self.last_compile_seconds,
+            "last_swap_seconds": self.last_swap_seconds,
+        }
+
+
+# Un TableStore por archivo y por intervalo, compartido por todos los asistentes
+# del proceso (y heredado por los procesos hijos)
+_table_stores = {}
+_table_stores_lock = threading.Lock()
+
+
+def get_table_store(path=None, check_interval=2.0):
+    """
+    TableStore compartido para path (por defecto GOLF_TABLES_FILE o
+    TABLES_FILE); las tablas se compilan una sola vez por proceso
+    """
+    path = os.path.abspath(path or os.environ.get(TABLES_FILE_ENV) or TABLES_FILE)
+    with _table_stores_lock:
+        store = _table_stores.get((path, check_interval))
+        if store is None:
+            store = _table_stores[(path, check_interval)] = TableStore(path, check_interval)
+        return store
+
+
+def _restart_table_watchers():
+    """
+    Tras un fork solo sobrevive el hilo que lo hizo: los hijos heredan las
+    tablas ya compiladas (compartidas por copia en escritura) pero necesitan
+    sus propios hilos vigilantes y cerrojos nuevos
+    """
+    global _table_stores_lock
+    _table_stores_lock = threading.Lock()
+    for store in _table_stores.values():
+        store._reloading = threading.Lock()
+        store._watcher = None
+        store.start_watching()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_table_watchers)
+
+
+class GolfAssistant:
+    def __init__(self, mode="fast", model_dir=None, on_missing="error", fast_path=True,
+                 cache_size=1024, cache_ttl=None, max_workers=4, max_pending=64,
+                 request_timeout=None, metrics=False, disk_cache=None,
+                 disk_cache_size=100000, tables_file=None, reload_interval=2.0,
+                 profiles=None, event_log=None):
+        # El modelo de Spacy se carga de forma perezosa en el primer uso,
+        # solo con los componentes que necesita el modo elegido
+        if mode not in PIPELINE_EXCLUDES:
+            raise ValueError(f"Modo de carga desconocido: {mode!r} "
+                             f"(opciones: {', '.join(PIPELINE_EXCLUDES)})")
+        # Si falta el modelo: "error" falla enseguida, "blank" usa build_blank_pipeline
+        if on_missing not in ("error", "blank"):
+            raise ValueError(f"on_missing debe ser 'error' o 'blank', no {on_missing!r}")
+        self.mode = mode
+        self.model_dir = model_dir
+        self.on_missing = on_missing
+        # Camino rápido sin Spacy para mensajes bien formados y sus contadores
+        self.fast_path = fast_path
+        self.fast_path_hits = 0
+        self.fast_path_misses = 0
+        # Cachés de dos niveles: texto normalizado -> ShotFeatures y
+        # (distancia, terreno, elevación) -> (palo, razón)
+        self.feature_cache = LRUCache(cache_size, cache_ttl)
+        self.recommendation_cache = LRUCache(cache_size, cache_ttl)
+        # Interfaz asíncrona: pool fijo de hilos para el trabajo de Spacy, límite
+        # de peticiones pendientes (en cola o en curso) y tiempo máximo por petición
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self._executor = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.rejected_requests = 0
+        self.timed_out_requests = 0
+        self._nlp = None
+        self._nlp_lock = threading.Lock()
+        # Tiempo de carga y memoria residente del último modelo cargado
+        self.load_stats = {}
+        # Instrumentación opcional: tiempos por etapa y contadores (ver golf_metrics)
+        self.metrics = Metrics() if metrics else None
+        # Caché persistente opcional de lo analizado con Spacy (ruta de un archivo
+        # SQLite); sus claves llevan la etiqueta de las tablas
+        self.disk_cache = None
+        # Perfiles de palos por jugador (golf_profiles.PlayerProfileStore u otro
+        # objeto con get(jugador)); sin perfil se usan los rangos de las tablas
+        self.profiles = profiles
+        # Registro opcional de eventos para analítica (ruta de un archivo JSON
+        # lines, ver golf_events); sin él no se mide ni se registra nada
+        self.event_log = EventLog(event_log) if event_log is not None else None
+
+        # Rangos de los palos y léxicos: tablas compiladas y compartidas, que se
+        # recargan en caliente si cambia el archivo (reload_interval=None no recarga)
+        self.table_store = get_table_store(tables_file, reload_interval)
+
+        if disk_cache is not None:
+            self.disk_cache = DiskFeatureCache(disk_cache, disk_cache_size,
+                                               f"features-v{FEATURES_VERSION}")
+
+    @property
+    def tables(self):
+        """Tablas vigentes (GolfTables); cada petición usa las que lee al empezar"""
+        return self.table_store.tables
+
+    @property
+    def club_ranges(self):
+        """Rangos de distancia (en yardas) de cada palo"""
+        return self.table_store.tables.club_ranges
+
+    @property
+    def club_index(self):
+        return self.table_store.tables.club_index
+
+    @property
+    def terrain_synonyms(self):
+        """Sinónimos de cada tipo de terreno"""
+        return self.table_store.tables.terrain_synonyms
+
+    @property
+    def elevation_terms(self):
+        """Términos de cada tipo de elevación"""
+        return self.table_store.tables.elevation_terms
+
+    @property
+    def golf_terms(self):
+        """Términos relacionados con golf"""
+        return self.table_store.tables.golf_terms
+
+    @property
+    def commerce_terms(self):
+        """Términos de compra o venta"""
+        return self.table_store.tables.commerce_terms
+
+    @property
+    def lexicon(self):
+        """Índice de todos los léxicos, compilado junto con las tablas"""
+        return self.table_store.tables.lexicon
+
+    @property
+    def nlp(self):
+        """Pipeline de Spacy; se carga la primera vez que se usa"""
+        if self._nlp is None:
+            self.load()
+        return self._nlp
+
+    @nlp.setter
+    def nlp(self, pipeline):
+        self._nlp = pipeline
+
+    def load(self):
+        """
+        Carga el modelo de español de Spacy si aún no está cargado.
+        Nunca descarga nada: si el modelo no está disponible localmente lanza
+        ModelNotFoundError, o usa el pipeline de respaldo si on_missing="blank".
+        Devuelve load_stats con el modelo, el modo, los componentes activos, el
+        tiempo de carga en segundos y la memoria residente (KB) antes y después.
+        """
+        with self._nlp_lock:
+            if self._nlp is not None:
+                return self.load_stats
+
+            rss_before = _current_rss_kb()
+            start = time.perf_counter()
+            try:
+                model = resolve_model(MODEL_NAME, self.model_dir)
+                nlp = spacy.load(model, exclude=PIPELINE_EXCLUDES[self.mode])
+            except ModelNotFoundError:
+                if self.on_missing != "blank":
+                    raise
+                model = "blank"
+                nlp = build_blank_pipeline(lexicon_words(self.tables))
+
+            self.load_stats = {
+                "model": model,
+                "mode": self.mode,
+                "components": list(nlp.pipe_names),
+                "load_seconds": time.perf_counter() - start,
+                "rss_before_kb": rss_before,
+                "rss_after_kb": _current_rss_kb(),
+            }
+            self._nlp = nlp
+            return self.load_stats
+
+    def parse(self, text):
+        """
+        Analiza el texto y devuelve un ParsedMessage.
+        Primero intenta el camino rápido sin Spacy; si el mensaje no es apto,
+        lo analiza con Spacy. Si ya recibe un ParsedMessage lo devuelve tal cual.
+        """
+        if isinstance(text, ParsedMessage):
+            return text
+        message = self._fast_parse(text)
+        if message is not None:
+            return message
+        return ParsedMessage.from_doc(self.nlp(text.lower()))
+
+    def _fast_parse(self, text):
+        """
+        Camino rápido: analiza el texto sin Spacy cuando todas sus palabras están
+        en FAST_PATH_LEMMAS o son números. Devuelve None si el mensaje es ambiguo
+        y debe pasar por Spacy. Actualiza los contadores de aciertos y fallos.
+        """
+        if not self.fast_path:
+            return None
+        message = _fast_message(text)
+        if message is not None:
+            self.fast_path_hits += 1
+        else:
+            self.fast_path_misses += 1
+        return message
+
+    def fast_path_stats(self):
+        """Aciertos, fallos y tasa de aciertos del camino rápido"""
+        total = self.fast_path_hits + self.fast_path_misses
+        return {
+            "hits": self.fast_path_hits,
+            "misses": self.fast_path_misses,
+            "hit_rate": self.fast_path_hits / total if total else 0.0,
         }
 
     def extract_distance(self, text):
         """
-        Extrae la distancia del texto usando Spacy para mejor reconocimiento.
+        Extrae la distancia en yardas del texto; las distancias en metros se
+        convierten a yardas.
         Ejemplos:
         - "Estoy a 150 yardas" -> 150
-        - "Quedan como doscientos metros" -> 200
-        - "Aproximadamente 100m" -> 100
+        - "Quedan como doscientos metros" -> 219
+        - "Estoy a ciento treinta y cinco yardas" -> 135
+        - "Aproximadamente 100m" -> 109
+        - "Estoy a 100 m." -> 109
+        Acepta texto o un ParsedMessage ya analizado.
         """
-        doc = self.nlp(text.lower())
+        message = self.parse(text)
+        tokens = message.tokens
+        size = len(tokens)
         
-        # Buscar números en el texto
-        for token in doc:
-            if token.like_num and token.i + 1 < len(doc):
-                # Verificar si el token siguiente es una unidad de medida
-                next_token = doc[token.i + 1]
-                if any(unit in next_token.text for unit in ["yardas", "metros", "mts", "m", "y"]):
-                    try:
-                        # Convertir texto a número (maneja tanto dígitos como palabras)
-                        if token.is_digit:
-                            return int(token.text)
-                        else:
-                            # Para números escritos con palabras
-                            return w2n.word_to_num(token.text)
-                    except (ValueError, AttributeError):
-                        continue
+        # Buscar números (con dígitos o con palabras) seguidos de una unidad
+        for i, token in enumerate(tokens):
+            if token.isdigit():
+                if i + 1 < size:
+                    next_token = tokens[i + 1]
+                    if any(unit in next_token for unit in ["yardas", "metros", "mts", "m", "y"]):
+                        # Spacy deja la abreviatura con su punto ("m."): quitarlo
+                        # para que to_yards reconozca la unidad
+                        return to_yards(int(token), next_token.rstrip("."))
+            elif token in SPANISH_NUMBER_WORDS:
+                # Con palabras la unidad debe ser exacta, para no tomar "un campo" por 1 m
+                distance, end = parse_spanish_number(tokens, i)
+                if end < size and (tokens[end] in YARD_UNITS or tokens[end] in METRE_UNITS):
+                    return to_yards(distance, tokens[end])
         
         # Si no se encontró con el método anterior, intentar con expresión regular
-        match = re.search(r'(\d+)\s*(?:yardas|metros|mts?|y)', text, re.IGNORECASE)
-        return int(match.group(1)) if match else None
+        match = DISTANCE_RE.search(message.text)
+        return to_yards(int(match.group(1)), match.group(2).lower()) if match else None
 
-    def extract_terrain(self, text):
+    def extract_terrain(self, text, tables=None):
         """
         Detecta el tipo de terreno usando Spacy para lematización y
         reconocimiento de sinónimos.
+        Acepta texto o un ParsedMessage ya analizado, y las tablas (GolfTables)
+        a usar; por defecto las vigentes.
         """
-        doc = self.nlp(text.lower())
-        lemmas = [token.lemma_ for token in doc]
+        message = self.parse(text)
+        if tables is None:
+            tables = self.tables
         
-        # Buscar coincidencias con los términos de terreno
-        for terrain, synonyms in self.terrain_synonyms.items():
-            # Verificar si algún sinónimo está en los lemas
-            if any(synonym in ' '.join(lemmas) for synonym in synonyms):
-                return terrain
-                
-        # Si no se encontró, intentar con bigramas (combinaciones de dos palabras)
-        bigrams = [' '.join(lemmas[i:i+2]) for i in range(len(lemmas)-1)]
-        for terrain, synonyms in self.terrain_synonyms.items():
-            if any(synonym in bigrams for synonym in synonyms):
-                return terrain
-                
-        return "desconocido"
-
-    def extract_elevation(self, text):
+        # Buscar sinónimos de terreno en los lemas (incluye los bigramas)
+        terrain = tables.lexicon.terrain(message)
+        return terrain if terrain is not None else "desconocido"
+
+    def extract_elevation(self, text, tables=None):
         """
         Detecta la elevación usando Spacy para un mejor reconocimiento de términos.
         Considera sinónimos y expresiones relacionadas con la elevación.
+        Acepta texto o un ParsedMessage ya analizado, y las tablas (GolfTables)
+        a usar; por defecto las vigentes.
         """
-        doc = self.nlp(text.lower())
-        lemmas = [token.lemma_ for token in doc]
+        message = self.parse(text)
+        doc = message.doc
+        if tables is None:
+            tables = self.tables
         
-        # Buscar términos de elevación
-        for elevation, terms in self.elevation_terms.items():
-            # Verificar términos individuales
-            if any(term in lemmas for term in terms):
-                return elevation
-                
-            # Verificar bigramas para expresiones compuestas
-            bigrams = [' '.join(lemmas[i:i+2]) for i in range(len(lemmas)-1)]
-            if any(term in bigrams for term in terms):
-                return elevation
+        # Buscar términos de elevación en lemas y bigramas (expresiones compuestas)
+        elevation = tables.lexicon.elevation(message)
+        if elevation is not None:
+            return elevation
         
         # Análisis de dependencias para frases como "está cuesta arriba"
+        # (solo disponible si el pipeline se cargó con el parser)
+        if doc is None or not doc.has_annotation("DEP"):
+            return "plano"
+        elevation_terms = tables.elevation_terms
         for token in doc:
             if token.dep_ == "advmod" and token.head.lemma_ in ["estar", "encontrar", "estar"]:
-                if any(term in token.lemma_ for terms in self.elevation_terms.values() for term in terms):
-                    for elevation, terms in self.elevation_terms.items():
+                if any(term in token.lemma_ for terms in elevation_terms.values() for term in terms):
+                    for elevation, terms in elevation_terms.items():
                         if any(term in token.lemma_ for term in terms):
                             return elevation
         
         return "plano"  # Por defecto, asumir terreno plano
 
-    def recommend_club(self, distance, terrain, elevation):
+    def recommend_club(self, distance, terrain, elevation, player=None):
+        """(palo, razón) para un golpe; choose_club da el resultado sin textos"""
+        result = self.choose_club(distance, terrain, elevation, player)
+        return result.club, result.reason
+
+    def recommend_clubs(self, distances, terrains, elevations, player=None):
+        """
+        Versión por lotes de recommend_club para secuencias paralelas de
+        distancias, terrenos y elevaciones. Devuelve una lista de (palo, razón).
+        """
+        return [(result.club, result.reason)
+                for result in self.choose_clubs(distances, terrains, elevations, player,
+                                                results=True)]
+
+    def choose_club(self, distance, terrain, elevation, player=None, tables=None):
+        """
+        Recommendation para un golpe, sin generar la razón ni la respuesta.
+        Usa los rangos de `tables` (por defecto las tablas vigentes).
+        """
         # Ajustar distancia según la elevación
+        adjusted = self._adjust_distance(distance, elevation)
+
+        # Recomendar palo basado en la distancia (con los rangos del jugador si
+        # tiene perfil)
+        club = self._club_index(player, tables).lookup(adjusted)
+        return self._choice(club, distance, adjusted, terrain, elevation)
+
+    def choose_clubs(self, distances, terrains, elevations, player=None, tables=None,
+                     results=False):
+        """
+        Versión vectorizada de choose_club para secuencias (o arrays de NumPy)
+        paralelas de distancias, terrenos y elevaciones, pensada para analizar
+        millones de golpes: el ajuste por elevación, la búsqueda del palo y las
+        reglas de terreno se calculan sobre arrays. Devuelve un ClubChoices con
+        un array por campo; con results=True, una lista de Recommendation (se
+        crea un objeto por golpe).
+        """
+        distances_array = np.asarray(distances, dtype=np.float64)
+        # Los arrays de texto de NumPy se comparan tal cual; las listas, como objetos
+        terrains_array = terrains if isinstance(terrains, np.ndarray) else np.asarray(
+            terrains, dtype=object)
+        elevations_array = elevations if isinstance(elevations, np.ndarray) else np.asarray(
+            elevations, dtype=object)
+        # Mismos factores que _adjust_distance
+        adjusted = distances_array * np.select(
+            [elevations_array == "subida", elevations_array == "bajada"], [1.1, 0.9], 1.0)
+        ids, names = self._club_index(player, tables).lookup_ids(adjusted)
+        clubs = names[ids]
+        is_wedge = np.array([name is not None and "Wedge" in name for name in names])[ids]
+
+        # Índice en TERRAIN_RULES de la primera regla que se cumple (como _terrain_choice)
+        rule = np.select([np.equal(clubs, None),
+                          (terrains_array == "bunker") & ~is_wedge,
+                          (terrains_array == "rough") & (adjusted > 150),
+                          (terrains_array == "green") & (adjusted <= 40),
+                          (terrains_array == "tee") & (adjusted >= 200),
+                          terrains_array == "fairway"],
+                         np.arange(len(TERRAIN_RULES)), len(TERRAIN_RULES))
+        replacement = _RULE_CLUBS[rule]
+        clubs = np.where(np.equal(replacement, None), clubs, replacement)
+        confidence = np.where(rule == 0, CONFIDENCE_NO_CLUB,
+                              np.where(terrains_array == "desconocido",
+                                       CONFIDENCE_UNKNOWN_TERRAIN, CONFIDENCE_KNOWN_TERRAIN))
+        choices = ClubChoices(clubs, _RULE_REASONS[rule], adjusted, confidence)
+        if not results:
+            return choices
+
+        adjust = self._adjust_distance
+        return [Recommendation(club, reason_id, distance, adjust(distance, elevation), terrain,
+                               elevation, shot_confidence)
+                for club, reason_id, distance, terrain, elevation, shot_confidence
+                in zip(clubs.tolist(), choices.reason_id.tolist(), distances, terrains,
+                       elevations, confidence.tolist())]
+
+    def _choice(self, club, distance, adjusted, terrain, elevation):
+        club, reason_id = self._terrain_choice(club, adjusted, terrain)
+        if reason_id == "no_club":
+            confidence = CONFIDENCE_NO_CLUB
+        elif terrain == "desconocido":
+            confidence = CONFIDENCE_UNKNOWN_TERRAIN
+        else:
+            confidence = CONFIDENCE_KNOWN_TERRAIN
+        return Recommendation(club, reason_id, distance, adjusted, terrain, elevation, confidence)
+
+    def _club_index(self, player, tables=None):
+        """Perfil del jugador si lo tiene; si no, el índice de las tablas"""
+        if player is not None and self.profiles is not None:
+            profile = self.profiles.get(player)
+            if profile is not None:
+                return profile
+        return (self.tables if tables is None else tables).club_index
+
+    @staticmethod
+    def _adjust_distance(distance, elevation):
+        """Distancia efectiva según la elevación"""
         if elevation == "subida":
-            distance *= 1.1  # Aumentar distancia en un 10% para subidas
+            return distance * 1.1  # Aumentar distancia en un 10% para subidas
         elif elevation == "bajada":
-            distance *= 0.9  # Reducir distancia en un 10% para bajadas
-
-        # Recomendar palo basado en la distancia
-        for club, (min_dist, max_dist) in self.club_ranges.items():
-            if min_dist <= distance <= max_dist:
-                # Ajustar recomendación según el terreno
-                if terrain == "bunker" and "Wedge" not in club:
-                    return "Sand Wedge (SW)", "Recomiendo el Sand Wedge para salir del bunker con facilidad."
-                elif terrain == "rough" and distance > 150:
-                    return "Hierro 5", "Un hierro 5 es una buena opción para salir del rough con distancia."
-                elif terrain == "green" and distance <= 40:
-                    return "Putter", "Usa el putter para rodar la pelota hacia el hoyo."
-                elif terrain == "tee" and distance >= 200:
-                    return "Driver", "El driver es ideal para el tee de salida en distancias largas."
-                elif terrain == "fairway":
-                    return club, f"El {club} es adecuado para esta distancia desde el fairway."
-                else:
-                    return club, f"Puedes usar el {club} para esta distancia."
-
-        return "No se pudo determinar", "Lo siento, no pude determinar una recomendación adecuada."
-
-    def is_golf_related(self, text):
+            return distance * 0.9  # Reducir distancia en un 10% para bajadas
+        return distance
+
+    @staticmethod
+    def _terrain_choice(club, distance, terrain):
+        """
+        Ajusta la recomendación del palo según el terreno.
+        Devuelve (palo, identificador de la razón en REASON_TEMPLATES).
+        """
+        if club is None:
+            return UNDETERMINED_CLUB, "no_club"
+        if terrain == "bunker" and "Wedge" not in club:
+            return "Sand Wedge (SW)", "bunker"
+        elif terrain == "rough" and distance > 150:
+            return "Hierro 5", "rough"
+        elif terrain == "green" and distance <= 40:
+            return "Putter", "green"
+        elif terrain == "tee" and distance >= 200:
+            return "Driver", "tee"
+        elif terrain == "fairway":
+            return club, "fairway"
+        else:
+            return club, "default"
+
+    def is_golf_related(self, text, tables=None):
         """
         Verifica si el texto está relacionado con golf.
         Devuelve True si es sobre golf, False si no lo es.
+        Acepta texto o un ParsedMessage ya analizado, y las tablas (GolfTables)
+        a usar; por defecto las vigentes.
         """
-        doc = self.nlp(text.lower())
-        lemmas = [token.lemma_ for token in doc]
-        
-        # Términos relacionados con golf
-        golf_terms = [
-            'golf', 'hoyo', 'green', 'fairway', 'rough', 'bunker', 'tee', 'bandera',
-            'palo', 'hierro', 'driver', 'putter', 'wedg', 'madera', 'hoyo', 'campo',
-            'cancha', 'golfista', 'golfístico', 'golfístico', 'golfear', 'golfista'
-        ]
+        message = self.parse(text)
+        lexicon = (self.tables if tables is None else tables).lexicon
         
         # Verificar si hay términos de golf en el texto
-        if any(term in ' '.join(lemmas) for term in golf_terms):
+        if lexicon.is_golf(message):
             return True
             
         # Verificar si hay términos de compra o venta
-        commerce_terms = [
-            'comprar', 'vender', 'precio', 'costo', 'valor', 'pesos', 'dólar', 'euro',
-            'compra', 'venta', 'tienda', 'comercio', 'factura', 'pagar', 'pago', 'dinero'
-        ]
-        
-        if any(term in ' '.join(lemmas) for term in commerce_terms):
+        if lexicon.is_commerce(message):
             return False
             
         # Si no es claramente de compra ni de golf, asumir que es de golf
         # para mantener la funcionalidad principal
         return True
 
-    def process_input(self, text):
+    def process_input(self, text, player=None):
         """
         Procesa la entrada del usuario y genera una recomendación de palo de golf.
         Si el mensaje no está relacionado con golf, devuelve un mensaje apropiado.
+        Con player, la recomendación usa el perfil de palos de ese jugador.
+        Devuelve un RecommendationText: el texto de siempre, con el resultado
+        estructurado en .result.
+        """
+        return self.evaluate(text, player).message
+
+    def recommend(self, text, player=None):
+        """
+        Procesa la entrada y devuelve el resultado estructurado en un diccionario:
+        golf, distance, terrain, elevation, club, reason y message (el mismo
+        texto que devuelve process_input). club y reason son None si no hay
+        recomendación. Los campos de Recommendation.to_dict se añaden al final.
+        """
+        return self.evaluate(text, player).to_dict()
+
+    def evaluate(self, text, player=None):
+        """
+        Procesa la entrada y devuelve el resultado como Recommendation, sin
+        generar ningún texto hasta que se pida.
+        Todo el mensaje se resuelve con las tablas vigentes al empezar, aunque
+        se recarguen mientras tanto.
+        """
+        tables = self.tables
+        if self.event_log is None and self.metrics is None:
+            return self._evaluate(self.analyze(text, tables), player, tables)
+        start = time.perf_counter()
+        features = self.analyze(text, tables)
+        result = self._logged_evaluate(text, features, player, start, tables)
+        self._observe_request(start)
+        return result
+
+    def preview(self, text, full=False, player=None):
+        """
+        Resultado para una vista previa mientras el usuario escribe; no se
+        registra en event_log. Con full=False solo consulta las cachés en
+        memoria y el camino rápido (microsegundos, apto para el hilo de la
+        interfaz) y devuelve None si el mensaje necesita Spacy; con full=True lo
+        analiza, y el resultado queda en caché para cuando se envíe el mensaje.
+        Lo que se resuelve sin Spacy no se guarda en las cachés ni cuenta en sus
+        estadísticas, las del camino rápido ni las etapas de las métricas: los
+        prefijos que se analizan mientras se escribe expulsarían a los mensajes
+        reales. El tiempo de cada vista previa se registra aparte, en la etapa
+        preview.
+        """
+        if self.metrics is None:
+            return self._preview(text, full, player)
+        start = time.perf_counter()
+        result = self._preview(text, full, player)
+        self.metrics.observe("preview", time.perf_counter() - start)
+        return result
+
+    def _preview(self, text, full, player):
+        tables = self.tables
+        key = (tables.tag, text.lower())
+        features = self.feature_cache.peek(key)
+        if features is None and self.fast_path:
+            message = _fast_message(text)
+            if message is not None:
+                features = self._plain_extract_features(message, tables)
+        if features is None:
+            if not full:
+                return None
+            features = self._nlp_features(text, tables)
+        return self._evaluate(features, player, tables, preview=True)
+
+    def _log_event(self, text, features, player, started=None, analyzed=None, tables=None):
+        """
+        Calcula el resultado de un mensaje ya analizado y lo registra en
+        event_log con los tiempos de análisis y de recomendación (si se
+        indican). Devuelve el Recommendation.
+        """
+        result = self._evaluate(features, player, tables)
+        if started is None:
+            self.event_log.record(text, features, result.club, player=player)
+        else:
+            self.event_log.record(text, features, result.club, analyzed - started,
+                                  time.perf_counter() - analyzed, player=player)
+        return result
+
+    def analyze(self, text, tables=None):
+        """
+        Extrae las características del golpe (ShotFeatures) del texto con las
+        tablas indicadas (por defecto las vigentes, leídas una sola vez).
+        Los textos ya vistos se resuelven desde la caché sin analizarlos de nuevo.
+        """
+        if tables is None:
+            tables = self.tables
+        if isinstance(text, ParsedMessage):
+            return self._extract_features(text, tables)
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        features = self._quick_features(text, tables)
+        if features is None:
+            features = self._nlp_features(text, tables)
+        if metrics is not None:
+            metrics.observe("analyze", time.perf_counter() - start)
+        return features
+
+    def _observe_request(self, start):
+        """Registra en las métricas la duración de una petición completa"""
+        if self.metrics is not None:
+            self.metrics.observe("request", time.perf_counter() - start)
+
+    def _quick_features(self, text, tables):
+        """
+        Características del golpe sin usar Spacy ni el disco: desde la caché en
+        memoria o por el camino rápido. Devuelve None si el mensaje necesita el
+        análisis completo (_nlp_features, que consulta antes la caché en disco).
         """
+        key = (tables.tag, text.lower())
+        features = self.feature_cache.get(key)
+        if features is None:
+            metrics = self.metrics
+            if metrics is None:
+                message = self._fast_parse(text)
+            else:
+                start = time.perf_counter()
+                message = self._fast_parse(text)
+                metrics.observe("parse_fast" if message is not None else "fast_path_reject",
+                                time.perf_counter() - start)
+            if message is not None:
+                features = self._extract_features(message, tables)
+                self.feature_cache.put(key, features)
+        return features
+
+    def _disk_features(self, key):
+        """
+        Características guardadas en la caché en disco, o None. Es una consulta
+        a SQLite que puede esperar a un volcado: no debe hacerse en el bucle de
+        eventos ni en el hilo de la interfaz.
+        """
+        if self.disk_cache is None:
+            return None
+        stored = self.disk_cache.get("|".join(key))
+        if stored is None:
+            return None
+        features = ShotFeatures._make(stored)
+        self.feature_cache.put(key, features)
+        return features
+
+    def _nlp_features(self, text, tables):
+        """
+        Características del golpe desde la caché en disco o, si no están,
+        analizando el texto con Spacy
+        """
+        key = (tables.tag, text.lower())
+        features = self._disk_features(key)
+        if features is not None:
+            return features
+        nlp = self.nlp
+        metrics = self.metrics
+        # Analizar el texto una sola vez y reutilizarlo en todos los extractores
+        if metrics is None:
+            doc = nlp(key[1])
+        else:
+            start = time.perf_counter()
+            doc = nlp(key[1])
+            metrics.observe("parse_nlp", time.perf_counter() - start)
+        features = self._extract_features(ParsedMessage.from_doc(doc), tables)
+        self._store_features(key, features)
+        return features
+
+    def _store_features(self, key, features):
+        """Guarda lo analizado con Spacy en la caché en memoria y en la de disco"""
+        self.feature_cache.put(key, features)
+        if self.disk_cache is not None:
+            self.disk_cache.put("|".join(key), features)
+
+    def cache_stats(self):
+        """Contadores de las cachés de resultados (y de la caché en disco, si la hay)"""
+        stats = {
+            "features": self.feature_cache.stats(),
+            "recommendations": self.recommendation_cache.stats(),
+        }
+        if self.disk_cache is not None:
+            stats["disk"] = self.disk_cache.stats()
+        return stats
+
+    def stats(self):
+        """
+        Estado completo del asistente: carga del modelo, camino rápido, cachés,
+        pool asíncrono y, si la instrumentación está activa, los tiempos por
+        etapa (request, analyze, preview, parse_fast, parse_nlp, classify,
+        distance, terrain, elevation y recommend) con sus contadores
+        """
+        return {
+            "load": dict(self.load_stats),
+            "tables": self.table_store.stats(),
+            "fast_path": self.fast_path_stats(),
+            "caches": self.cache_stats(),
+            "concurrency": self.concurrency_stats(),
+            "profiles": self.profiles.stats() if self.profiles is not None else None,
+            "events": self.event_log.stats() if self.event_log is not None else None,
+            "metrics": self.metrics.stats() if self.metrics is not None else None,
+        }
+
+    def prometheus_text(self, prefix="golf_assistant"):
+        """Las estadísticas de stats() en formato de texto de Prometheus"""
+        counters = {
+            "fast_path_hits": self.fast_path_hits,
+            "fast_path_misses": self.fast_path_misses,
+            "rejected_requests": self.rejected_requests,
+            "timed_out_requests": self.timed_out_requests,
+        }
+        gauges = {"pending_requests": self._pending}
+        for cache, cache_stats in self.cache_stats().items():
+            for field, value in cache_stats.items():
+                if field in ("hits", "misses", "evictions", "expirations", "writes",
+                             "write_errors"):
+                    counters[f"{cache}_cache_{field}"] = value
+                elif isinstance(value, (int, float)):
+                    gauges[f"{cache}_cache_{field}"] = value
+        return prometheus_text(self.metrics, counters, gauges, prefix)
+
+    def profile(self, text, sort="cumulative", limit=25):
+        """
+        Procesa un solo mensaje bajo cProfile, sin usar la caché de
+        características para que el análisis se ejecute de verdad.
+        Devuelve (resultado de recommend, informe de pstats en texto).
+        """
+        def run():
+            return self._evaluate(self._extract_features(self.parse(text))).to_dict()
+        return profile_call(run, sort=sort, limit=limit)
+
+    def process_batch(self, texts, batch_size=64, n_process=1, player=None):
+        """
+        Procesa muchos mensajes a la vez usando nlp.pipe.
+        Devuelve un generador con las recomendaciones en el mismo orden de entrada,
+        idénticas a las que daría process_input para cada mensaje.
+        Los mensajes aptos para el camino rápido no pasan por Spacy; el resto se
+        analiza en lotes y, con n_process > 1, repartido entre varios procesos.
+        """
+        for result in self.evaluate_batch(texts, batch_size, n_process, player):
+            yield result.message
+
+    def recommend_batch(self, texts, batch_size=64, n_process=1, player=None):
+        """Como process_batch, pero devuelve resultados estructurados (ver recommend)"""
+        for result in self.evaluate_batch(texts, batch_size, n_process, player):
+            yield result.to_dict()
+
+    def evaluate_batch(self, texts, batch_size=64, n_process=1, player=None):
+        """
+        Como process_batch, pero devuelve cada resultado como Recommendation.
+        Todo el lote usa las tablas vigentes al empezar. Con métricas, cada
+        resultado registra como petición lo que tardó en obtenerse (incluida su
+        parte del lote de Spacy que lo trajo).
+        """
+        results = self._batch_results(texts, batch_size, n_process, player)
+        if self.metrics is None:
+            yield from results
+            return
+        while True:
+            start = time.perf_counter()
+            result = next(results, None)
+            if result is None:
+                return
+            self._observe_request(start)
+            yield result
+
+    def _batch_results(self, texts, batch_size, n_process, player):
+        tables = self.tables
+        if self.event_log is not None:
+            texts = list(texts)
+            for text, features in zip(texts, self._batch_features(texts, batch_size, n_process,
+                                                                  tables)):
+                yield self._log_event(text, features, player, tables=tables)
+            return
+        evaluate = self._evaluate
+        for features in self._batch_features(texts, batch_size, n_process, tables):
+            yield evaluate(features, player, tables)
+
+    def _batch_features(self, texts, batch_size, n_process, tables):
+        """
+        Genera las ShotFeatures de cada texto en orden, usando nlp.pipe. Spacy
+        solo se carga cuando aparece el primer texto que no resuelven las
+        cachés ni el camino rápido.
+        """
+        texts = iter(texts)
+
+        def resolve(text):
+            features = self._quick_features(text, tables)
+            if features is None:
+                features = self._disk_features((tables.tag, text.lower()))
+            return features
+
+        # Hasta el primer mensaje que necesita Spacy no hace falta el modelo
+        for text in texts:
+            features = resolve(text)
+            if features is None:
+                first = text
+                break
+            yield features
+        else:
+            return
+
+        # Características ya resueltas en orden de entrada (por la caché o por el
+        # camino rápido); None marca los mensajes que esperan a Spacy
+        pending = deque([None])
+
+        def texts_for_nlp():
+            yield first.lower()
+            for text in texts:
+                features = resolve(text)
+                pending.append(features)
+                if features is None:
+                    yield text.lower()
+
+        docs = self.nlp.pipe(texts_for_nlp(), batch_size=batch_size, n_process=n_process)
+        for doc in docs:
+            # Entregar los resultados ya resueltos que preceden al siguiente Doc
+            while pending[0] is not None:
+                yield pending.popleft()
+            pending.popleft()
+            features = self._extract_features(ParsedMessage.from_doc(doc), tables)
+            self._store_features((tables.tag, doc.text), features)
+            yield features
+        while pending:
+            yield pending.popleft()
+
+    @property
+    def executor(self):
+        """Pool de hilos compartido para el análisis con Spacy (se crea al primer uso)"""
+        if self._executor is None:
+            with self._pending_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="golf-nlp")
+        return self._executor
+
+    async def aprocess_input(self, text, timeout=None, player=None):
+        """
+        Versión asíncrona de process_input para compartir un asistente entre
+        muchas conversaciones concurrentes.
+        Los mensajes en la caché en memoria o aptos para el camino rápido se
+        responden en el momento; el resto (incluidas la consulta a la caché en
+        disco y la carga del perfil del jugador desde SQLite) se resuelve en el
+        pool fijo de hilos. Si ya hay
+        max_pending peticiones pendientes lanza AssistantOverloadedError, y si la
+        respuesta tarda más de timeout segundos (por defecto request_timeout)
+        lanza asyncio.TimeoutError.
+        """
+        start = time.perf_counter()
+        tables = self.tables
+        features = self._quick_features(text, tables)
+        if features is not None and self._profile_cached(player):
+            result = self._logged_evaluate(text, features, player, start, tables)
+            self._observe_request(start)
+            return result.message
+
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self.rejected_requests += 1
+                raise AssistantOverloadedError(
+                    f"Hay {self._pending} peticiones pendientes (máximo {self.max_pending})")
+            self._pending += 1
+        try:
+            job = self.executor.submit(self._prepare, text, features, player, tables)
+        except BaseException:
+            self._release_pending(None)
+            raise
+        # La plaza se libera cuando el hilo termina (o si se cancela en cola),
+        # no cuando el cliente deja de esperar
+        job.add_done_callback(self._release_pending)
+
+        timeout = self.request_timeout if timeout is None else timeout
+        try:
+            features = await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+        except asyncio.TimeoutError:
+            self.timed_out_requests += 1
+            raise
+        result = self._logged_evaluate(text, features, player, start, tables)
+        self._observe_request(start)
+        return result.message
+
+    def _profile_cached(self, player):
+        """True si el perfil del jugador (o que no lo tiene) ya está en memoria"""
+        if player is None or self.profiles is None:
+            return True
+        is_cached = getattr(self.profiles, "is_cached", None)
+        return is_cached is None or is_cached(player)
+
+    def _prepare(self, text, features, player, tables):
+        """
+        Trabajo del pool para aprocess_input: analiza el texto si hace falta y
+        deja el perfil del jugador en memoria, para que el resto de la petición
+        no consulte SQLite en el bucle de eventos. Devuelve las ShotFeatures.
+        """
+        if features is None:
+            features = self._nlp_features(text, tables)
+        if not self._profile_cached(player):
+            self.profiles.get(player)
+        return features
+
+    def _logged_evaluate(self, text, features, player, started, tables):
+        """_evaluate registrando el evento si hay event_log"""
+        if self.event_log is None:
+            return self._evaluate(features, player, tables)
+        return self._log_event(text, features, player, started, time.perf_counter(), tables)
+
+    def _release_pending(self, job):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def concurrency_stats(self):
+        """Estado del pool asíncrono: pendientes, límites, rechazos y timeouts"""
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "max_workers": self.max_workers,
+            "rejected": self.rejected_requests,
+            "timed_out": self.timed_out_requests,
+        }
+
+    def after_fork(self):
+        """
+        Prepara el asistente en un proceso hijo recién creado con fork: el
+        modelo y las tablas se comparten con el padre, pero el pool de hilos y
+        las conexiones SQLite (caché en disco y perfiles) y el hilo del registro
+        de eventos tienen que ser propios
+        """
+        self._executor = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._nlp_lock = threading.Lock()
+        if self.disk_cache is not None:
+            self.disk_cache.reopen()
+        reopen = getattr(self.profiles, "reopen", None)
+        if reopen is not None:
+            reopen()
+        if self.event_log is not None:
+            self.event_log.reopen()
+
+    def close(self):
+        """
+        Libera el pool de hilos, cancelando las peticiones que sigan en cola, y
+        vuelca y cierra la caché en disco y el registro de eventos
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+
+    def _extract_features(self, message, tables=None):
+        """
+        Extrae las características del golpe de un mensaje ya analizado, con
+        las tablas indicadas (por defecto las vigentes)
+        """
+        if tables is None:
+            tables = self.tables
+        if self.metrics is not None:
+            return self._timed_extract_features(message, tables)
+        return self._plain_extract_features(message, tables)
+
+    def _plain_extract_features(self, message, tables):
+        """_extract_features sin instrumentación"""
         # Primero verificar si el mensaje está relacionado con golf
-        if not self.is_golf_related(text):
-            return "Lo siento, solo puedo ayudarte con recomendaciones de golf. " \
-                  "Puedes preguntarme sobre qué palo usar en cierta distancia o situación en el campo de golf."
-        
+        if not self.is_golf_related(message, tables):
+            return ShotFeatures(False, None, None, None)
+
         # Si es sobre golf, proceder con el procesamiento normal
-        distance = self.extract_distance(text)
+        distance = self.extract_distance(message)
+        if distance is None:
+            return ShotFeatures(True, None, None, None)
+
+        return ShotFeatures(True, distance,
+                            self.extract_terrain(message, tables),
+                            self.extract_elevation(message, tables))
+
+    def _timed_extract_features(self, message, tables):
+        """Como _extract_features, registrando el tiempo de cada extractor"""
+        observe = self.metrics.observe
+        clock = time.perf_counter
+        start = clock()
+        golf = self.is_golf_related(message, tables)
+        end = clock()
+        observe("classify", end - start)
+        if not golf:
+            self.metrics.inc("off_topic_messages")
+            return ShotFeatures(False, None, None, None)
+
+        start = end
+        distance = self.extract_distance(message)
+        end = clock()
+        observe("distance", end - start)
         if distance is None:
-            return "Por favor, indícame la distancia al hoyo (por ejemplo, 'Estoy a 150 yardas')."
+            self.metrics.inc("missing_distance_messages")
+            return ShotFeatures(True, None, None, None)
 
-        terrain = self.extract_terrain(text)
-        elevation = self.extract_elevation(text)
+        start = end
+        terrain = self.extract_terrain(message, tables)
+        end = clock()
+        observe("terrain", end - start)
+        elevation = self.extract_elevation(message, tables)
+        observe("elevation", clock() - end)
+        self.metrics.inc("shot_messages")
+        return ShotFeatures(True, distance, terrain, elevation)
 
-        club, reason = self.recommend_club(distance, terrain, elevation)
-        return f"Recomendación: {club}\n\nRazón: {reason}"
+    def _evaluate(self, features, player=None, tables=None, preview=False):
+        """
+        Recommendation a partir de las características del golpe, con las
+        tablas indicadas (por defecto las vigentes). Con preview=True no toca
+        la caché de recomendaciones ni las métricas.
+        """
+        if not features.golf:
+            return OFF_TOPIC_RESULT
+        
+        if features.distance is None:
+            return MISSING_DISTANCE_RESULT
+
+        return self._recommendation(features, player, tables, preview)
+
+    def _recommendation(self, features, player=None, tables=None, preview=False):
+        """
+        Recommendation para las características de un golpe, usando la caché;
+        como los resultados son inmutables, la caché guarda también sus textos
+        ya generados. Las recomendaciones con el perfil de un jugador no se
+        guardan en caché: la consulta al perfil ya es una búsqueda binaria.
+        """
+        if player is not None and self.profiles is not None:
+            profile = self.profiles.get(player)
+            if profile is not None:
+                distance, terrain, elevation = features[1:]
+                adjusted = self._adjust_distance(distance, elevation)
+                return self._choice(profile.lookup(adjusted), distance, adjusted, terrain, elevation)
+        if tables is None:
+            tables = self.tables
+        key = (tables.tag,) + features[1:]
+        if preview:
+            recommendation = self.recommendation_cache.peek(key)
+            if recommendation is None:
+                recommendation = self.choose_club(*features[1:], tables=tables)
+            return recommendation
+        recommendation = self.recommendation_cache.get(key)
+        if recommendation is None:
+            if self.metrics is None:
+                recommendation = self.choose_club(*features[1:], tables=tables)
+            else:
+                start = time.perf_counter()
+                recommendation = self.choose_club(*features[1:], tables=tables)
+                self.metrics.observe("recommend", time.perf_counter() - start)
+            self.recommendation_cache.put(key, recommendation)
+        return recommendation
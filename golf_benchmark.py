@@ -0,0 +1,768 @@
+"""
+Banco de pruebas de rendimiento del Asistente de Golf.
+
+Genera un corpus sintético y reproducible de mensajes en español (golpes con
+distancia, unidades, sinónimos de terreno y términos de elevación, además de
+saludos, mensajes sin distancia y preguntas de compra) y mide:
+
+- arranque en frío por modo de carga (en un proceso nuevo para cada modo) y
+  tiempo hasta la primera respuesta al reiniciar con la caché en disco
+- latencia por mensaje: camino rápido, Spacy y caché
+- rendimiento por lotes y del índice de palos
+- coste del enrutador de intenciones y del flujo de mensajes de la GUI
+  (sesiones, historial de 10k mensajes y, si hay pantalla, el widget del chat)
+- recarga en caliente de las tablas: compilación, sustitución y latencia de
+  las peticiones mientras se recargan
+- registro de eventos: coste por mensaje de registrarlo y ritmo del hilo
+  de escritura
+- perfiles de jugadores: carga perezosa desde SQLite, latencia de las
+  recomendaciones con 50k perfiles en memoria y memoria por perfil
+- memoria: residente tras la carga, por sesión y por entrada de caché, y por
+  worker al compartir el modelo con fork (antes y después de atender el corpus)
+
+Los resultados se escriben en JSON para poder comparar ejecuciones:
+
+    python golf_benchmark.py --output resultados.json
+    python golf_benchmark.py --output nuevos.json --compare resultados.json
+
+Solo se comparan ejecuciones con el mismo tamaño de corpus y modo (--quick).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+from golf_assistant import PIPELINE_EXCLUDES, TABLES_FILE, GolfAssistant, _current_rss_kb
+from golf_metrics import memory_usage
+from golf_profiles import PlayerProfileStore
+from golf_sessions import SALUDOS, EnrutadorIntenciones, GestorSesiones, medir_memoria_por_sesion
+
+# Mensaje del corpus con su tipo: "shot", "missing_distance", "greeting" o "commerce"
+CorpusMessage = namedtuple("CorpusMessage", ["kind", "text"])
+
+# Proporción de cada tipo de mensaje en el corpus por defecto
+DEFAULT_MIX = {"shot": 0.7, "missing_distance": 0.1, "greeting": 0.1, "commerce": 0.1}
+
+SHOT_PREFIXES = ["estoy a", "tengo", "quedan", "me faltan", "la bola está a", ""]
+DISTANCE_UNITS = ["yardas", "metros", "mts", "m", "y"]
+SHOT_FILLERS = ["", "del hoyo", "con viento en contra", "en el campo"]
+MISSING_DISTANCE_TEMPLATES = [
+    "estoy en el {terrain}",
+    "qué palo uso en el {terrain}",
+    "la bola quedó en el {terrain} {elevation}",
+]
+
+# Piezas para escribir distancias con palabras ("ciento treinta y cinco")
+_UNITS_WORDS = ["", "uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve",
+                "diez", "once", "doce", "trece", "catorce", "quince", "dieciséis", "diecisiete",
+                "dieciocho", "diecinueve", "veinte", "veintiuno", "veintidós", "veintitrés",
+                "veinticuatro", "veinticinco", "veintiséis", "veintisiete", "veintiocho",
+                "veintinueve"]
+_TENS_WORDS = {3: "treinta", 4: "cuarenta", 5: "cincuenta", 6: "sesenta", 7: "setenta",
+               8: "ochenta", 9: "noventa"}
+_HUNDREDS_WORDS = ["", "ciento", "doscientos", "trescientos"]
+
+COMMERCE_TEMPLATES = [
+    "quiero {term} algo",
+    "cuál es el {term}",
+    "¿cuánto {term} necesito?",
+    "tienes {term}",
+]
+
+# Mensaje de la primera petición en el arranque en frío (necesita Spacy)
+COLD_START_MESSAGE = "la bola quedó en la trampa de arena a 70 yardas"
+
+# Programa que mide el arranque en frío en un intérprete nuevo
+_COLD_START_CODE = """
+import json, sys, time
+start = time.perf_counter()
+from golf_assistant import GolfAssistant, _current_rss_kb
+imported = time.perf_counter()
+assistant = GolfAssistant(mode=sys.argv[1], model_dir=sys.argv[2] or None)
+assistant.load()
+loaded = time.perf_counter()
+assistant.process_input(sys.argv[3])
+first = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "load_s": loaded - imported,
+                  "first_message_s": first - loaded, "total_s": first - start,
+                  "rss_kb": _current_rss_kb()}))
+"""
+
+
+def spell_number(number):
+    """Escribe con palabras un número entre 1 y 399"""
+    if number == 100:
+        return "cien"
+    words = [_HUNDREDS_WORDS[number // 100]]
+    number %= 100
+    if number >= 30:
+        words.append(_TENS_WORDS[number // 10])
+        if number % 10:
+            words += ["y", _UNITS_WORDS[number % 10]]
+    else:
+        words.append(_UNITS_WORDS[number])
+    return " ".join(word for word in words if word)
+
+# Programa que mide el tiempo hasta la primera respuesta tras reiniciar, con o
+# sin caché en disco
+_RESTART_CODE = """
+import json, sys, time
+start = time.perf_counter()
+from golf_assistant import GolfAssistant
+assistant = GolfAssistant(model_dir=sys.argv[2] or None, disk_cache=sys.argv[1] or None)
+assistant.process_input(sys.argv[3])
+first = time.perf_counter()
+print(json.dumps({"first_response_s": first - start, "model_loaded": assistant._nlp is not None}))
+assistant.close()
+"""
+
+
+def generate_corpus(n=1000, seed=0, mix=None, assistant=None):
+    """
+    Genera n mensajes sintéticos (lista de CorpusMessage) a partir de los
+    léxicos del asistente. Una parte de las distancias se escribe con palabras.
+    Con la misma semilla el corpus es siempre el mismo.
+    """
+    assistant = assistant or GolfAssistant()
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    terrains = [term for terms in assistant.terrain_synonyms.values() for term in terms]
+    elevations = [term for terms in assistant.elevation_terms.values() for term in terms]
+
+    def shot():
+        distance = rng.randint(5, 300)
+        unit = rng.choice(DISTANCE_UNITS)
+        if rng.random() < 0.2:
+            unit = rng.choice(("yardas", "metros"))
+            distance = f"{spell_number(distance)} {unit}"
+        else:
+            distance = f"{distance}{unit}" if unit == "m" else f"{distance} {unit}"
+        parts = [
+            rng.choice(SHOT_PREFIXES),
+            distance,
+            f"en el {rng.choice(terrains)}" if rng.random() < 0.8 else "",
+            rng.choice(elevations) if rng.random() < 0.5 else "",
+            rng.choice(SHOT_FILLERS),
+        ]
+        return " ".join(part for part in parts if part)
+
+    def missing_distance():
+        return rng.choice(MISSING_DISTANCE_TEMPLATES).format(
+            terrain=rng.choice(terrains), elevation=rng.choice(elevations)).strip()
+
+    def greeting():
+        return rng.choice(SALUDOS)
+
+    def commerce():
+        return rng.choice(COMMERCE_TEMPLATES).format(term=rng.choice(assistant.commerce_terms))
+
+    builders = {"shot": shot, "missing_distance": missing_distance,
+                "greeting": greeting, "commerce": commerce}
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    corpus = []
+    for kind in rng.choices(kinds, weights, k=n):
+        text = builders[kind]()
+        if rng.random() < 0.3:
+            text = text[:1].upper() + text[1:]
+        corpus.append(CorpusMessage(kind, text))
+    return corpus
+
+
+def _summary(latencies):
+    """p50, p99 y media (ms) de una lista de latencias en segundos"""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"p50_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+    }
+
+
+def _timed(func, items):
+    """Latencia de func(item) para cada elemento"""
+    clock = time.perf_counter
+    latencies = []
+    for item in items:
+        start = clock()
+        func(item)
+        latencies.append(clock() - start)
+    return latencies
+
+
+def bench_cold_start(modes=tuple(PIPELINE_EXCLUDES), model_dir=None):
+    """Arranque en frío de cada modo: importación, carga, primer mensaje y memoria"""
+    results = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for mode in modes:
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _COLD_START_CODE, mode, model_dir or "",
+             COLD_START_MESSAGE],
+            cwd=here, capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+
+def bench_warm_restart(assistant, corpus, model_dir=None):
+    """
+    Tiempo desde el arranque de un proceso nuevo hasta la primera respuesta a
+    un mensaje ya visto que necesita Spacy, sin caché en disco y con ella
+    llena con los mensajes del corpus
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "features.sqlite")
+        warm = GolfAssistant(fast_path=False, disk_cache=path)
+        warm.nlp = assistant.nlp
+        texts = [message.text for message in corpus]
+        for _ in warm.process_batch(texts):
+            pass
+        entries = len(warm.disk_cache)
+        warm.close()
+
+        checker = GolfAssistant()
+        message = next(text for text in texts if checker._fast_parse(text) is None)
+        results = {"entries": entries, "file_bytes": os.path.getsize(path)}
+        for name, cache in (("cold", ""), ("warm", path)):
+            output = subprocess.run(
+                [sys.executable, "-W", "ignore", "-c", _RESTART_CODE, cache, model_dir or "",
+                 message],
+                cwd=here, capture_output=True, text=True, check=True).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+
+def bench_latency(assistant, corpus):
+    """
+    Latencia por mensaje de process_input sin caché, por el camino rápido (los
+    mensajes aptos) y por Spacy (todos, con el camino rápido desactivado), y
+    con la caché ya llena
+    """
+    texts = [message.text for message in corpus
+             if message.kind in ("shot", "missing_distance", "commerce")]
+    fast = GolfAssistant(cache_size=0)
+    fast.nlp = assistant.nlp
+    eligible = [text for text in texts if fast._fast_parse(text) is not None]
+    nlp_only = GolfAssistant(cache_size=0, fast_path=False)
+    nlp_only.nlp = assistant.nlp
+
+    cached = GolfAssistant(cache_size=len(texts) + 1)
+    cached.nlp = assistant.nlp
+    for text in texts:
+        cached.process_input(text)
+
+    return {
+        "fast_path_hit_rate": len(eligible) / len(texts) if texts else 0.0,
+        "fast_path": _summary(_timed(fast.process_input, eligible)),
+        "nlp": _summary(_timed(nlp_only.process_input, texts)),
+        "nlp_fast_eligible": _summary(_timed(nlp_only.process_input, eligible)),
+        "cached": _summary(_timed(cached.process_input, texts)),
+    }
+
+
+def bench_batch(assistant, corpus, batch_size=64):
+    """Mensajes por segundo de process_batch frente a process_input uno a uno, sin caché"""
+    texts = [message.text for message in corpus]
+    results = {}
+    for name, fast_path in (("fast_path", True), ("nlp_only", False)):
+        batch = GolfAssistant(cache_size=0, fast_path=fast_path)
+        batch.nlp = assistant.nlp
+        start = time.perf_counter()
+        for text in texts:
+            batch.process_input(text)
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in batch.process_batch(texts, batch_size=batch_size):
+            pass
+        batched = time.perf_counter() - start
+        results[name] = {
+            "sequential_messages_per_s": len(texts) / sequential,
+            "batch_messages_per_s": len(texts) / batched,
+        }
+    return results
+
+
+def bench_club_index(assistant, n=20000, seed=0):
+    """
+    Recomendaciones por segundo de recommend_clubs frente a recommend_club en
+    bucle, de choose_clubs creando un Recommendation por golpe y de
+    choose_clubs vectorizado sobre arrays de NumPy
+    """
+    rng = random.Random(seed)
+    terrains = list(assistant.terrain_synonyms) + ["desconocido"]
+    shots = [(rng.randint(0, 320), rng.choice(terrains), rng.choice(("subida", "bajada", "plano")))
+             for _ in range(n)]
+    start = time.perf_counter()
+    for shot in shots:
+        assistant.recommend_club(*shot)
+    single = time.perf_counter() - start
+    distances, shot_terrains, elevations = zip(*shots)
+    start = time.perf_counter()
+    assistant.recommend_clubs(distances, shot_terrains, elevations)
+    batched = time.perf_counter() - start
+    start = time.perf_counter()
+    assistant.choose_clubs(distances, shot_terrains, elevations, results=True)
+    chosen = time.perf_counter() - start
+    arrays = (np.array(distances), np.array(shot_terrains), np.array(elevations))
+    start = time.perf_counter()
+    assistant.choose_clubs(*arrays)
+    vectorized = time.perf_counter() - start
+    return {
+        "shots": n,
+        "single_per_s": n / single,
+        "batch_per_s": n / batched,
+        "batch_results_per_s": n / chosen,
+        "vectorized_per_s": n / vectorized,
+    }
+
+
+def bench_routing(assistant, corpus, repeat=5):
+    """Coste del enrutador de intenciones por mensaje (µs)"""
+    router = EnrutadorIntenciones(assistant.golf_terms, assistant.commerce_terms)
+    texts = [message.text.lower() for message in corpus]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            router.clasificar(text)
+        best = min(best, time.perf_counter() - start)
+    return {"per_message_us": best / len(texts) * 1e6}
+
+
+def bench_table_reload(assistant, corpus, reloads=20, interval=0.02):
+    """
+    Recarga en caliente: tiempo de compilación y de sustitución de las tablas,
+    y latencia de process_input sin recargas y mientras otro hilo reescribe
+    el archivo de tablas `reloads` veces
+    """
+    with open(TABLES_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    texts = [message.text for message in corpus if message.kind == "shot"]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "golf_tables.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        reloading = GolfAssistant(cache_size=0, tables_file=path, reload_interval=interval)
+        reloading.nlp = assistant.nlp
+        store = reloading.table_store
+        steady = _summary(_timed(reloading.process_input, texts))
+
+        def rewrite():
+            for i in range(reloads):
+                data["version"] += 1
+                data["club_ranges"]["Driver"][0] = 200 + i % 2
+                # Escritura atómica: archivo temporal y rename
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(path + ".tmp", path)
+                time.sleep(interval * 3)
+
+        writer = threading.Thread(target=rewrite)
+        latencies = []
+        writer.start()
+        while writer.is_alive():
+            latencies += _timed(reloading.process_input, texts[:50])
+        writer.join()
+        time.sleep(interval * 3)
+        store.stop_watching()
+        return {
+            "reloads": store.reloads,
+            "reload_errors": store.reload_errors,
+            "compile_ms": store.last_compile_seconds * 1000 if store.last_compile_seconds else None,
+            "swap_us": store.last_swap_seconds * 1e6 if store.last_swap_seconds else None,
+            "steady": steady,
+            "during_reload": _summary(latencies),
+        }
+
+
+def bench_event_log(assistant, corpus, repeat=5):
+    """
+    Coste de registrar cada mensaje en el registro de eventos: latencia de
+    process_input (con la caché caliente) sin registro y con él, y eventos por
+    segundo que escribe el hilo de fondo
+    """
+    texts = [message.text for message in corpus]
+    with tempfile.TemporaryDirectory() as folder:
+        logged = GolfAssistant(event_log=os.path.join(folder, "eventos.jsonl"))
+        logged.nlp = assistant.nlp
+        plain = GolfAssistant()
+        plain.nlp = assistant.nlp
+        for text in texts:
+            logged.analyze(text)
+            plain.analyze(text)
+        best_plain = best_logged = float("inf")
+        for _ in range(repeat):
+            best_plain = min(best_plain, sum(_timed(plain.process_input, texts)))
+            best_logged = min(best_logged, sum(_timed(logged.process_input, texts)))
+        events = logged.event_log
+        start = time.perf_counter()
+        events.flush()
+        logged.close()
+        drain = time.perf_counter() - start
+        return {
+            "plain_us": best_plain / len(texts) * 1e6,
+            "logged_us": best_logged / len(texts) * 1e6,
+            "events": events.written,
+            "batches": events.batches,
+            "dropped": events.dropped,
+            "final_flush_ms": drain * 1000,
+        }
+
+
+def _random_profile(rng, clubs):
+    """Rangos de un jugador: los de las tablas desplazados y escalados al azar"""
+    scale = rng.uniform(0.75, 1.2)
+    shift = rng.randint(-10, 10)
+    return {club: [max(0, int(low * scale) + shift), max(0, int(high * scale) + shift)]
+            for club, (low, high) in clubs.items()}
+
+
+def bench_profiles(assistant, corpus, players=50000, seed=0):
+    """
+    Perfiles de jugadores: carga perezosa desde SQLite de `players` perfiles,
+    latencia de process_input con todos ellos en memoria (frente a sin
+    jugador) y bytes por perfil cargado
+    """
+    rng = random.Random(seed)
+    texts = [message.text for message in corpus if message.kind == "shot"]
+    ids = [f"jugador-{i}" for i in range(players)]
+    with tempfile.TemporaryDirectory() as folder:
+        store = PlayerProfileStore(os.path.join(folder, "perfiles.sqlite3"), max_loaded=players)
+        start = time.perf_counter()
+        store.set_profiles((player, _random_profile(rng, assistant.club_ranges)) for player in ids)
+        write_seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            load = _timed(store.get, ids)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        profiled = GolfAssistant(profiles=store)
+        profiled.nlp = assistant.nlp
+        for text in texts:
+            profiled.analyze(text)
+        shots = [(rng.choice(texts), rng.choice(ids)) for _ in range(max(len(texts), 10000))]
+        with_profile = _timed(lambda shot: profiled.process_input(*shot), shots)
+        without_profile = _timed(lambda shot: profiled.process_input(shot[0]), shots)
+        queries = [(rng.choice(ids), rng.randint(0, 320)) for _ in range(len(shots))]
+        lookup = _timed(lambda query: store.get(query[0]).lookup(query[1]), queries)
+        store.close()
+    return {
+        "players": players,
+        "write_profiles_per_s": players / write_seconds,
+        "lazy_load": _summary(load),
+        "recommend_with_profile": _summary(with_profile),
+        "recommend_without_profile": _summary(without_profile),
+        "profile_lookup": _summary(lookup),
+        "bytes_per_profile": (after - before) / players,
+    }
+
+
+def bench_memory(assistant, corpus, sessions=10000):
+    """Memoria residente tras cargar el modelo, por sesión y por entrada de caché"""
+    cache = GolfAssistant(cache_size=len(corpus) + 1)
+    cache.nlp = assistant.nlp
+    texts = list(dict.fromkeys(message.text for message in corpus))
+    features = [cache.analyze(text) for text in texts]
+    cache.feature_cache.clear()
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for text, feature in zip(texts, features):
+            cache.feature_cache.put((cache.tables.tag, text.lower()), feature)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        "rss_kb": _current_rss_kb(),
+        "model_rss_kb": assistant.load_stats["rss_after_kb"] - assistant.load_stats["rss_before_kb"],
+        "bytes_per_session": medir_memoria_por_sesion(sessions),
+        "bytes_per_cache_entry": (after - before) / len(texts) if texts else 0.0,
+    }
+
+
+def bench_prefork(assistant, corpus, workers=4, freeze=True):
+    """
+    Memoria por worker al compartir el modelo ya cargado con fork, como
+    golf_server --workers: memoria del padre (lo que pagaría cada proceso
+    independiente) y de cada hijo al arrancar y tras atender el corpus.
+    Con freeze=False se omite gc.freeze() para ver cuánto aporta.
+    """
+    import gc
+
+    if not hasattr(os, "fork"):
+        return {"skipped": "os.fork no disponible"}
+    texts = [message.text for message in corpus]
+    assistant.process_input(texts[0])
+    parent = memory_usage()
+    gc.collect()
+    if freeze:
+        gc.freeze()
+    children = []
+    try:
+        for _ in range(workers):
+            reader, writer = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    os.close(reader)
+                    assistant.after_fork()
+                    start = memory_usage()
+                    for text in texts:
+                        assistant.process_input(text)
+                    gc.collect()
+                    with os.fdopen(writer, "w") as out:
+                        json.dump({"start": start, "after_corpus": memory_usage()}, out)
+                except BaseException:
+                    code = 1
+                finally:
+                    os._exit(code)
+            os.close(writer)
+            children.append((pid, reader))
+        reports = []
+        for pid, reader in children:
+            with os.fdopen(reader) as report:
+                data = report.read()
+            os.waitpid(pid, 0)
+            if data:
+                reports.append(json.loads(data))
+    finally:
+        if freeze:
+            gc.unfreeze()
+
+    def mean(stage, field):
+        values = [report[stage].get(field, 0) for report in reports]
+        return sum(values) / len(values) if values else 0.0
+
+    return {
+        "workers": workers,
+        "gc_freeze": freeze,
+        "parent_rss_kb": parent.get("rss_kb"),
+        "worker_private_kb_start": mean("start", "private_kb"),
+        "worker_private_kb_after": mean("after_corpus", "private_kb"),
+        "worker_pss_kb_after": mean("after_corpus", "pss_kb"),
+        # Memoria total (padre más lo propio de cada worker) frente a la de
+        # `workers` procesos independientes que cargan cada uno su modelo
+        "total_kb": parent.get("rss_kb", 0) + workers * mean("after_corpus", "private_kb"),
+        "independent_total_kb": workers * parent.get("rss_kb", 0),
+    }
+
+
+def bench_gui_pipeline(assistant, corpus, transcript=10000):
+    """
+    Flujo de mensajes de la GUI: respuesta de GestorSesiones por mensaje,
+    vista previa mientras se escribe (tiempo en el hilo de la interfaz por
+    tecla y por pausa), historial de `transcript` mensajes en disco y, si hay
+    pantalla, su inserción en el widget del chat
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ChatLTyPOS import ChatNicoGUI, HistorialChat, PRESUPUESTO_FRAME_MS, VistaPrevia
+
+    sessions = GestorSesiones(assistant)
+    sessions.procesar_mensaje("benchmark", "hola")
+    results = {"session_reply": _summary(
+        _timed(lambda text: sessions.procesar_mensaje("benchmark", text),
+               [message.text for message in corpus if message.kind != "greeting"]))}
+
+    # Escribir cada mensaje letra a letra con un asistente de cachés vacías,
+    # con una pausa al final de cada uno
+    typing = GolfAssistant()
+    typing.nlp = assistant.nlp
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preview = VistaPrevia(typing, executor, lambda version, result: None)
+        keystrokes, pauses = [], []
+        for message in corpus[:200]:
+            keystrokes += _timed(preview.tecla, [message.text[:i] for i in range(1, len(message.text) + 1)])
+            pauses += _timed(preview.pausa, [message.text])
+        stats = preview.estadisticas()
+    results["preview"] = {
+        "keystroke": {**_summary(keystrokes), "max_ms": max(keystrokes, default=0.0) * 1000},
+        "pause": {**_summary(pauses), "max_ms": max(pauses, default=0.0) * 1000},
+        "over_budget": stats["sobre_presupuesto"],
+        "budget_ms": PRESUPUESTO_FRAME_MS,
+        "reused_prefix_rate": stats["reutilizadas"] / len(keystrokes) if keystrokes else 0.0,
+        "background": stats["en_segundo_plano"],
+        "discarded": stats["descartadas"],
+    }
+
+    records = [(time.strftime("%H:%M"), "usuario" if i % 2 else "bot", corpus[i % len(corpus)].text, None)
+               for i in range(transcript)]
+    with tempfile.TemporaryDirectory() as folder:
+        history = HistorialChat(os.path.join(folder, "historial.jsonl"))
+        start = time.perf_counter()
+        for i in range(0, transcript, 2):
+            history.agregar_lote(records[i:i + 2])
+        results["history_messages_per_s"] = transcript / (time.perf_counter() - start)
+
+    try:
+        gui = ChatNicoGUI()
+    except Exception as e:  # Sin pantalla (TclError) no se puede crear la ventana
+        results["widget"] = {"skipped": str(e)}
+        return results
+    try:
+        start = time.perf_counter()
+        for _, kind, text, _ in records:
+            gui.agregar_mensaje(text, kind)
+        gui.root.update()
+        results["widget"] = {"messages_per_s": transcript / (time.perf_counter() - start)}
+    finally:
+        gui.cerrar_aplicacion()
+    return results
+
+
+def run_benchmarks(size=1000, seed=0, model_dir=None, quick=False):
+    """Ejecuta todo el banco de pruebas y devuelve {"meta": ..., "results": ...}"""
+    assistant = GolfAssistant(model_dir=model_dir)
+    assistant.load()
+    corpus = generate_corpus(size, seed, assistant=assistant)
+    results = {
+        "cold_start": bench_cold_start(("fast",) if quick else tuple(PIPELINE_EXCLUDES), model_dir),
+        "warm_restart": bench_warm_restart(assistant, corpus, model_dir),
+        "latency": bench_latency(assistant, corpus),
+        "batch": bench_batch(assistant, corpus),
+        "club_index": bench_club_index(assistant, 2000 if quick else 20000, seed),
+        "routing": bench_routing(assistant, corpus),
+        "table_reload": bench_table_reload(assistant, corpus, 5 if quick else 20),
+        "event_log": bench_event_log(assistant, corpus),
+        "profiles": bench_profiles(assistant, corpus, 5000 if quick else 50000, seed),
+        "gui_pipeline": bench_gui_pipeline(assistant, corpus, 1000 if quick else 10000),
+        "memory": bench_memory(assistant, corpus, 1000 if quick else 10000),
+        "prefork": bench_prefork(assistant, corpus, 2 if quick else 4),
+        "prefork_no_freeze": bench_prefork(assistant, corpus, 2 if quick else 4, freeze=False),
+    }
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "model": assistant.load_stats.get("model"),
+        "corpus_size": size,
+        "seed": seed,
+        "quick": quick,
+    }
+    try:
+        import spacy
+        meta["spacy"] = spacy.__version__
+    except ImportError:
+        pass
+    return {"meta": meta, "results": results}
+
+
+def _flatten(data, prefix=""):
+    """Aplana un diccionario anidado en {"a.b.c": número}"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# Campos de meta que deben coincidir para que dos ejecuciones sean comparables
+COMPARABLE_META = ("corpus_size", "quick")
+
+# Sentido de las métricas según el final de su nombre: ritmos y tasas mejoran
+# al subir; tiempos y memoria, al bajar. El resto (contadores y tamaños que
+# dependen de la configuración, como players o reloads) no se compara.
+HIGHER_IS_BETTER = ("_per_s", "_rate")
+LOWER_IS_BETTER = ("_ms", "_us", "_s", "_kb", "_kb_start", "_kb_after")
+LOWER_IS_BETTER_PREFIXES = ("bytes_per_",)
+
+
+def metric_direction(name):
+    """1 si la métrica mejora al subir, -1 si mejora al bajar, None si no se compara"""
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER) or leaf.startswith(LOWER_IS_BETTER_PREFIXES):
+        return -1
+    return None
+
+
+def meta_mismatch(current, baseline):
+    """(campo, base, actual) de los campos de COMPARABLE_META que difieren"""
+    before = baseline.get("meta", {})
+    now = current.get("meta", {})
+    return [(key, before.get(key), now.get(key))
+            for key in COMPARABLE_META if before.get(key) != now.get(key)]
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """
+    Compara dos resultados métrica a métrica en el sentido que da
+    metric_direction. Devuelve la lista de (métrica, base, actual, cambio
+    relativo) que empeoran más que tolerance; vacía si las ejecuciones no son
+    comparables (ver meta_mismatch).
+    """
+    if meta_mismatch(current, baseline):
+        return []
+    now = _flatten(current["results"])
+    before = _flatten(baseline["results"])
+    regressions = []
+    for name, old in before.items():
+        new = now.get(name)
+        direction = metric_direction(name)
+        if new is None or not old or direction is None:
+            continue
+        change = (new - old) / old
+        if -direction * change > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    """Punto de entrada del banco de pruebas"""
+    parser = argparse.ArgumentParser(description="Banco de pruebas del Asistente de Golf")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="archivo JSON donde escribir los resultados")
+    parser.add_argument("--size", type=int, default=1000, help="mensajes del corpus sintético")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model-dir", default=None, help="carpeta local con el modelo o su wheel")
+    parser.add_argument("--quick", action="store_true", help="tamaños reducidos y solo el modo fast")
+    parser.add_argument("--compare", default=None, help="resultados previos con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="empeoramiento relativo admitido antes de marcar una regresión")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.size, args.seed, args.model_dir, args.quick)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report["results"], indent=2, ensure_ascii=False))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        mismatch = meta_mismatch(report, baseline)
+        if mismatch:
+            differences = ", ".join(f"{key} {old} -> {new}" for key, old, new in mismatch)
+            print(f"No se compara con {args.compare}: {differences}", file=sys.stderr)
+            return
+        regressions = compare_results(report, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESIÓN {name}: {old:.4g} -> {new:.4g} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Caché persistente de características de golpes para el Asistente de Golf.
+
+Guarda en un archivo SQLite el resultado del análisis con Spacy de cada
+mensaje normalizado (golf, distancia, terreno, elevación), de modo que un
+proceso recién arrancado responde a los mensajes ya vistos sin cargar ni usar
+el modelo. Las escrituras se agrupan en lotes, el archivo se compacta al pasar
+de max_entries (se descartan las entradas más antiguas) y se vacía solo si la
+huella de los léxicos con que se calcularon las características cambia.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Rango de los enteros de SQLite: las distancias fuera de él no se guardan
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+
+class DiskFeatureCache:
+    """
+    Caché en disco texto normalizado -> (golf, distancia, terreno, elevación).
+    Las escrituras pendientes se guardan en memoria y se vuelcan en una sola
+    transacción cada write_batch entradas, con flush() o al cerrar. Si un
+    volcado falla, su lote se descarta y el error se cuenta en stats().
+    Es seguro usarla desde varios hilos.
+    """
+
+    def __init__(self, path, max_entries=100000, fingerprint="", write_batch=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.write_batch = write_batch
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.write_errors = 0
+        self.last_error = None
+
+        self._conn = self._connect()
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, golf INTEGER NOT NULL, "
+            "distance INTEGER, terrain TEXT, elevation TEXT, stored REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS features_stored ON features (stored)")
+
+        # Las características calculadas con otros léxicos ya no valen
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            with self._conn:
+                self._conn.execute("DELETE FROM features")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)",
+                                   (fingerprint,))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def reopen(self):
+        """
+        Abre una conexión nueva al mismo archivo. Se usa en los procesos hijos
+        tras un fork: SQLite no admite compartir una conexión entre procesos.
+        Las entradas pendientes heredadas se descartan (las escribe el padre).
+        """
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._conn = self._connect()
+
+    def get(self, key):
+        """Tupla (golf, distancia, terreno, elevación) guardada para key, o None"""
+        with self._lock:
+            features = self._pending.get(key)
+            if features is None:
+                row = self._conn.execute(
+                    "SELECT golf, distance, terrain, elevation FROM features WHERE key = ?",
+                    (key,)).fetchone()
+                if row is not None:
+                    features = (bool(row[0]),) + row[1:]
+            if features is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return features
+
+    def put(self, key, features):
+        """
+        Guarda una tupla (golf, distancia, terreno, elevación); se escribe en
+        lote. Las distancias que no caben en un entero de SQLite no se guardan.
+        """
+        distance = features[1]
+        if distance is not None and not -SQLITE_MAX_INTEGER <= distance <= SQLITE_MAX_INTEGER:
+            return
+        with self._lock:
+            self._pending[key] = tuple(features)
+            if len(self._pending) >= self.write_batch:
+                self._flush()
+
+    def flush(self):
+        """Escribe en disco las entradas pendientes"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        now = time.time()
+        rows = [(key, int(golf), distance, terrain, elevation, now)
+                for key, (golf, distance, terrain, elevation) in self._pending.items()]
+        # El lote sale de pendientes aunque falle, para no repetir el error en
+        # cada escritura posterior
+        self._pending.clear()
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except (sqlite3.Error, OverflowError, ValueError) as e:
+            self.write_errors += 1
+            self.last_error = str(e)
+            return
+        self.writes += len(rows)
+        if self._count() > self.max_entries:
+            self._compact()
+
+    def compact(self, vacuum=False):
+        """
+        Descarta las entradas más antiguas por encima de max_entries y, con
+        vacuum=True, reescribe el archivo para devolver el espacio libre.
+        Devuelve cuántas entradas se descartaron.
+        """
+        with self._lock:
+            self._flush()
+            removed = self._compact()
+            if vacuum:
+                self._conn.execute("VACUUM")
+            return removed
+
+    def _compact(self):
+        excess = self._count() - self.max_entries
+        if excess <= 0:
+            return 0
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM features WHERE key IN "
+                "(SELECT key FROM features ORDER BY stored LIMIT ?)", (excess,))
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.evictions += excess
+        return excess
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM features")
+
+    def close(self):
+        """Vuelca las entradas pendientes y cierra el archivo"""
+        with self._lock:
+            if self._conn is not None:
+                self._flush()
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self):
+        with self._lock:
+            return self._count() + len(self._pending)
+
+    def stats(self):
+        """Entradas, límite, tamaño en disco y contadores de la caché"""
+        size = 0
+        for suffix in ("", "-wal"):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        lookups = self.hits + self.misses
+        with self._lock:
+            return {
+                "size": self._count(),
+                "maxsize": self.max_entries,
+                "pending": len(self._pending),
+                "bytes": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "write_errors": self.write_errors,
+                "last_error": self.last_error,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
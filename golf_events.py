@@ -0,0 +1,239 @@
+"""
+Registro de eventos del Asistente de Golf para analítica.
+
+Cada mensaje atendido (su texto, las características extraídas, el palo
+recomendado y la latencia de cada etapa) se guarda como una línea JSON con
+siempre las mismas columnas y en el mismo orden (EVENT_FIELDS), de modo que
+el archivo se carga directamente como tabla (pandas.read_json(lines=True),
+DuckDB, Arrow...).
+
+Registrar un evento solo añade una tupla a un búfer en memoria: un hilo de
+escritura en segundo plano la serializa, escribe los eventos por lotes con
+una sola llamada a write y hace fsync una vez por lote. Si el búfer se llena
+los eventos nuevos se descartan (y se cuentan) en lugar de frenar las
+peticiones. El mismo hilo actualiza de forma incremental los agregados
+(distribución de palos y tasa de terreno desconocido, en total y en una
+ventana de los últimos golpes), así que nunca hace falta volver a leer el
+archivo.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+# Columnas de cada línea del registro, en orden
+EVENT_FIELDS = ("ts", "intent", "player", "text", "golf", "distance", "terrain",
+                "elevation", "club", "analyze_ms", "recommend_ms", "total_ms")
+
+# Terreno que el asistente asigna cuando el mensaje no indica ninguno
+UNKNOWN_TERRAIN = "desconocido"
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 4)
+
+
+class RollingAggregates:
+    """
+    Agregados de los eventos actualizados uno a uno: totales desde el
+    arranque y los mismos valores sobre los últimos `window` golpes
+    """
+
+    def __init__(self, window=1000, unknown_terrain=UNKNOWN_TERRAIN):
+        self.window = window
+        self.unknown_terrain = unknown_terrain
+        self.events = 0
+        self.intents = Counter()
+        self.shots = 0
+        self.clubs = Counter()
+        self.unknown_terrain_shots = 0
+        self.total_ms = 0.0
+        self.timed_events = 0
+        # (palo, terreno desconocido) de los últimos golpes
+        self._recent = deque()
+        self._recent_clubs = Counter()
+        self._recent_unknown = 0
+
+    def update(self, row):
+        """Añade un evento (tupla en el orden de EVENT_FIELDS)"""
+        _, intent, _, _, _, _, terrain, _, club, _, _, total_ms = row
+        self.events += 1
+        self.intents[intent] += 1
+        if total_ms is not None:
+            self.total_ms += total_ms
+            self.timed_events += 1
+        if club is None:
+            return
+        unknown = terrain == self.unknown_terrain
+        self.shots += 1
+        self.clubs[club] += 1
+        self.unknown_terrain_shots += unknown
+        self._recent.append((club, unknown))
+        self._recent_clubs[club] += 1
+        self._recent_unknown += unknown
+        if len(self._recent) > self.window:
+            old_club, old_unknown = self._recent.popleft()
+            self._recent_clubs[old_club] -= 1
+            if not self._recent_clubs[old_club]:
+                del self._recent_clubs[old_club]
+            self._recent_unknown -= old_unknown
+
+    @staticmethod
+    def _distribution(clubs, shots):
+        return {club: count / shots for club, count in clubs.most_common()} if shots else {}
+
+    def snapshot(self):
+        """Diccionario con los agregados totales y los de la ventana"""
+        recent = len(self._recent)
+        return {
+            "events": self.events,
+            "intents": dict(self.intents),
+            "shots": self.shots,
+            "clubs": dict(self.clubs.most_common()),
+            "club_distribution": self._distribution(self.clubs, self.shots),
+            "unknown_terrain_rate": self.unknown_terrain_shots / self.shots if self.shots else 0.0,
+            "mean_total_ms": self.total_ms / self.timed_events if self.timed_events else 0.0,
+            "window": {
+                "shots": recent,
+                "club_distribution": self._distribution(self._recent_clubs, recent),
+                "unknown_terrain_rate": self._recent_unknown / recent if recent else 0.0,
+            },
+        }
+
+
+class EventLog:
+    """
+    Registro de eventos en un archivo JSON lines de solo añadido, escrito por
+    un hilo en segundo plano cada flush_interval segundos o cada batch_size
+    eventos, con un fsync por lote (fsync=False lo omite).
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, path, batch_size=256, flush_interval=1.0, fsync=True,
+                 max_pending=100000, window=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_pending = max_pending
+        self.aggregates = RollingAggregates(window)
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.write_errors = 0
+        self.last_error = None
+        self._open()
+
+    def _open(self):
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        # Un solo escritor a la vez: el hilo de fondo o flush()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._run, name="golf-events", daemon=True)
+        self._writer.start()
+
+    def record(self, text, features=None, club=None, analyze_seconds=None,
+               recommend_seconds=None, intent="golf", player=None):
+        """
+        Encola el evento de un mensaje: sus características (ShotFeatures o
+        None si no llegó a analizarse), el palo recomendado y los segundos de
+        análisis y de recomendación. Nunca bloquea esperando al disco.
+        """
+        if features is None:
+            golf = distance = terrain = elevation = None
+        else:
+            golf, distance, terrain, elevation = features
+        total = None
+        if analyze_seconds is not None:
+            total = analyze_seconds + (recommend_seconds or 0.0)
+        row = (time.time(), intent, player, text, golf, distance, terrain, elevation, club,
+               _ms(analyze_seconds), _ms(recommend_seconds), _ms(total))
+        with self._lock:
+            if len(self._buffer) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            self.recorded += 1
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closing
+            self._flush()
+            if closing:
+                return
+
+    def _flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                rows = list(self._buffer)
+                self._buffer.clear()
+            lines = "".join(json.dumps(dict(zip(EVENT_FIELDS, row)), ensure_ascii=False) + "\n"
+                            for row in rows)
+            try:
+                self._file.write(lines)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                    self.fsyncs += 1
+            except (OSError, ValueError) as e:
+                self.write_errors += 1
+                self.last_error = str(e)
+                return
+            self.written += len(rows)
+            self.batches += 1
+            aggregates = self.aggregates
+            with self._lock:
+                for row in rows:
+                    aggregates.update(row)
+
+    def flush(self):
+        """Escribe ya los eventos pendientes (con su fsync)"""
+        self._flush()
+
+    def reopen(self):
+        """
+        Vuelve a abrir el archivo y arranca un hilo de escritura nuevo; se usa
+        en los procesos hijos tras un fork, donde el hilo del padre no existe.
+        Los eventos pendientes heredados se descartan (los escribe el padre).
+        """
+        self._open()
+
+    def close(self):
+        """Escribe los eventos pendientes, detiene el hilo y cierra el archivo"""
+        if self._closing:
+            return
+        self._closing = True
+        self._wake.set()
+        self._writer.join()
+        self._flush()
+        self._file.close()
+
+    def stats(self):
+        """Contadores del registro y agregados de los eventos ya escritos"""
+        with self._lock:
+            return {
+                "path": self.path,
+                "pending": len(self._buffer),
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+                "fsyncs": self.fsyncs,
+                "write_errors": self.write_errors,
+                "last_error": self.last_error,
+                "aggregates": self.aggregates.snapshot(),
+            }
@@ -0,0 +1,121 @@
+"""
+Prueba de carga del servidor HTTP del Asistente de Golf.
+
+Envía peticiones concurrentes a POST /recommend y muestra la latencia p50/p99
+y el rendimiento. Sin --url arranca un servidor local en un puerto libre.
+
+    python golf_loadtest.py --requests 2000 --concurrency 8
+    python golf_loadtest.py --url http://127.0.0.1:8000 --batch 32
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Mensajes de ejemplo con los que se construyen las peticiones
+SAMPLE_MESSAGES = [
+    "Estoy a 150 yardas en el fairway",
+    "Tengo 90 yardas hasta el green con viento en contra",
+    "Estoy en el rough a 120 yardas",
+    "Estoy en el bunker a 60 yardas",
+    "Quedan 180 metros cuesta arriba",
+    "me faltan 30 yardas al hoyo en el green",
+    "estoy a 210 yardas desde el tee",
+    "la bola quedó en la trampa de arena a 70 yardas",
+    "¿Cuánto cuesta un driver nuevo?",
+]
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+def run_load_test(url, requests=1000, concurrency=8, batch=1, seed=0):
+    """
+    Lanza las peticiones contra url y devuelve un diccionario con el número de
+    peticiones y mensajes, errores, latencias p50/p99/máxima (ms) y
+    rendimiento (peticiones y mensajes por segundo).
+    """
+    target = urlparse(url)
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(requests):
+        if batch > 1:
+            payload = {"texts": [rng.choice(SAMPLE_MESSAGES) for _ in range(batch)]}
+        else:
+            payload = {"text": rng.choice(SAMPLE_MESSAGES)}
+        bodies.append(json.dumps(payload).encode("utf-8"))
+
+    # Una conexión persistente por hilo de carga
+    local = threading.local()
+
+    def send(body):
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        start = time.perf_counter()
+        local.conn.request("POST", "/recommend", body, {"Content-Type": "application/json"})
+        response = local.conn.getresponse()
+        response.read()
+        return time.perf_counter() - start, response.status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, bodies))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "requests": requests,
+        "messages": requests * batch,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in results if status != 200),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "requests_per_s": requests / elapsed,
+        "messages_per_s": requests * batch / elapsed,
+    }
+
+
+def main(argv=None):
+    """Punto de entrada de la prueba de carga"""
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor de golf")
+    parser.add_argument("--url", default=None, help="servidor a probar (por defecto arranca uno local)")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=1, help="mensajes por petición")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        from golf_assistant import GolfAssistant
+        from golf_server import create_server
+
+        assistant = GolfAssistant()
+        assistant.load()
+        server = create_server(assistant, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        report = run_load_test(url, args.requests, args.concurrency, args.batch)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
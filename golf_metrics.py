@@ -0,0 +1,195 @@
+"""
+Instrumentación opcional del Asistente de Golf.
+
+Metrics guarda un histograma de tiempos por etapa (análisis, distancia,
+terreno, elevación, recomendación...) y contadores con nombre. El asistente
+solo mide cuando tiene un Metrics asignado (GolfAssistant(metrics=True)); si
+no, cada petición paga una única comprobación de atributo.
+
+Los datos se consultan con stats() o en formato de texto de Prometheus con
+prometheus_text(). profile_call ejecuta una sola llamada bajo cProfile y
+memory_usage da la memoria del proceso, separando la compartida de la propia.
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+from bisect import bisect_left
+
+# Límites superiores (en segundos) de los cubos de los histogramas: de 1 µs a 10 s
+DEFAULT_BUCKETS = tuple(base * 10.0 ** exponent
+                        for exponent in range(-6, 1)
+                        for base in (1, 2.5, 5)) + (10.0,)
+
+
+class Histogram:
+    """Histograma acumulativo de cubos fijos, como los de Prometheus"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        # Un cubo por límite más el de desbordamiento (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimación del cuantil q: el límite superior del cubo donde cae"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Histogramas de tiempo por etapa y contadores con nombre.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """Registra la duración (en segundos) de una etapa"""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        """Incrementa un contador"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def stats(self):
+        """
+        Diccionario con "stages" (count, sum, mean, p50 y p99 en segundos de
+        cada etapa) y "counters"
+        """
+        with self._lock:
+            return {
+                "stages": {stage: histogram.stats()
+                           for stage, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def prometheus_lines(self, prefix):
+        """Líneas en formato de texto de Prometheus para histogramas y contadores"""
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.count, h.sum)
+                          for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        if histograms:
+            name = f"{prefix}_stage_seconds"
+            lines.append(f"# HELP {name} Duración de cada etapa del análisis")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, (counts, count, total) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {total!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        for counter, value in sorted(counters.items()):
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        return lines
+
+
+def prometheus_text(metrics=None, counters=None, gauges=None, prefix="golf_assistant"):
+    """
+    Texto de exposición de Prometheus con los histogramas y contadores de
+    metrics (si lo hay) más los contadores y gauges indicados, dos
+    diccionarios nombre -> número
+    """
+    lines = metrics.prometheus_lines(prefix) if metrics is not None else []
+    for counter, value in sorted((counters or {}).items()):
+        name = f"{prefix}_{counter}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    for gauge, value in sorted((gauges or {}).items()):
+        name = f"{prefix}_{gauge}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def profile_call(func, *args, sort="cumulative", limit=25):
+    """
+    Ejecuta func(*args) bajo cProfile (solo en el hilo actual) y devuelve
+    (resultado, informe) con las `limit` funciones más costosas según `sort`
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(limit)
+    return result, report.getvalue()
+
+
+# Campos de /proc/<pid>/smaps_rollup que informa memory_usage
+_SMAPS_FIELDS = {
+    "Rss": "rss_kb",
+    "Pss": "pss_kb",
+    "Shared_Clean": "shared_clean_kb",
+    "Shared_Dirty": "shared_dirty_kb",
+    "Private_Clean": "private_clean_kb",
+    "Private_Dirty": "private_dirty_kb",
+}
+
+
+def memory_usage(pid="self"):
+    """
+    Memoria del proceso en KB según /proc/<pid>/smaps_rollup: residente (rss),
+    proporcional (pss, la compartida se reparte entre los procesos que la
+    usan), compartida y privada. Tras un fork, la memoria privada es la que
+    el hijo ya no comparte con el padre. Diccionario vacío si no se puede medir.
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                field, _, value = line.partition(":")
+                name = _SMAPS_FIELDS.get(field)
+                if name is not None:
+                    usage[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return {}
+    if usage:
+        usage["shared_kb"] = usage.get("shared_clean_kb", 0) + usage.get("shared_dirty_kb", 0)
+        usage["private_kb"] = usage.get("private_clean_kb", 0) + usage.get("private_dirty_kb", 0)
+    return usage
@@ -0,0 +1,261 @@
+"""
+Perfiles de palos por jugador para el Asistente de Golf.
+
+Cada perfil guarda los rangos de distancia de los palos de un jugador y se
+compila en arrays compactos (extremos de los rangos y el palo de cada tramo),
+de modo que decenas de miles de perfiles caben en memoria y cada consulta es
+una búsqueda binaria. Los perfiles viven en un archivo SQLite y se cargan de
+forma perezosa la primera vez que se piden; los cargados se mantienen en una
+LRU acotada, y los jugadores sin perfil en otra, para no consultar SQLite en
+cada petición de un jugador desconocido.
+"""
+
+import json
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+
+from golf_assistant import ClubRangeIndex, _interval_ids
+
+# Identificador de "ningún palo" en los arrays de palos de un perfil
+NO_CLUB = 0xFFFF
+
+
+class PlayerProfile:
+    """
+    Rangos de un jugador compilados: extremos de los rangos en un array de
+    enteros y, para cada extremo y cada tramo entre extremos, el índice del
+    palo en la tabla de nombres compartida. Misma semántica que ClubRangeIndex:
+    gana el primer palo del perfil cuyo rango contiene la distancia.
+    """
+
+    __slots__ = ("bounds", "at_bound", "between", "clubs")
+
+    def __init__(self, club_ranges, clubs):
+        """
+        club_ranges: {palo: (mínimo, máximo)} en yardas, en orden de preferencia
+        clubs: ClubNames compartido con el resto de perfiles
+        """
+        index = ClubRangeIndex(club_ranges)
+        self.clubs = clubs
+        self.bounds = array("H", index.bounds.tolist())
+        self.at_bound = array("H", map(clubs.id, index._at_bound.tolist()))
+        self.between = array("H", map(clubs.id, index._between.tolist()))
+
+    def lookup(self, distance):
+        """Palo para la distancia dada, o None si ningún rango del jugador la contiene"""
+        bounds = self.bounds
+        i = bisect_left(bounds, distance)
+        if i < len(bounds) and bounds[i] == distance:
+            return self.clubs.names[self.at_bound[i]]
+        return self.clubs.names[self.between[i]]
+
+    def lookup_ids(self, distances):
+        """
+        Versión vectorizada de lookup, como ClubRangeIndex.lookup_ids: los
+        arrays del perfil se leen con NumPy sin copiarlos
+        """
+        names = self.clubs.names_array()
+        ids = _interval_ids(np.frombuffer(self.bounds, dtype=np.uint16),
+                            np.frombuffer(self.at_bound, dtype=np.uint16),
+                            np.frombuffer(self.between, dtype=np.uint16), distances)
+        # NO_CLUB apunta al None del final de la tabla de nombres
+        ids = np.where(ids == NO_CLUB, len(names) - 1, ids)
+        return ids, names
+
+    def lookup_many(self, distances):
+        """Versión por lotes de lookup: array de NumPy con el palo (o None) de cada distancia"""
+        ids, names = self.lookup_ids(distances)
+        return names[ids]
+
+
+class ClubNames:
+    """Tabla de nombres de palos compartida por todos los perfiles de un almacén"""
+
+    def __init__(self):
+        self.names = {NO_CLUB: None}
+        self._ids = {None: NO_CLUB}
+        self._lock = threading.Lock()
+        self._array = None
+
+    def names_array(self):
+        """Array de NumPy con el nombre de cada identificador y None al final"""
+        names = self._array
+        if names is None or len(names) != len(self._ids):
+            with self._lock:
+                names = np.array([self.names[i] for i in range(len(self._ids) - 1)] + [None],
+                                 dtype=object)
+                self._array = names
+        return names
+
+    def id(self, name):
+        """Identificador del palo, que se añade a la tabla si es nuevo"""
+        club_id = self._ids.get(name)
+        if club_id is None:
+            with self._lock:
+                club_id = self._ids.get(name)
+                if club_id is None:
+                    club_id = len(self._ids) - 1
+                    if club_id >= NO_CLUB:
+                        raise ValueError("Demasiados nombres de palos distintos")
+                    self.names[club_id] = name
+                    self._ids[name] = club_id
+        return club_id
+
+
+def _validate_ranges(club_ranges):
+    """Rangos como {palo: (mínimo, máximo)} con enteros entre 0 y 65535"""
+    if not isinstance(club_ranges, dict) or not club_ranges:
+        raise ValueError("El perfil debe ser un diccionario no vacío {palo: [mínimo, máximo]}")
+    ranges = {}
+    for club, bounds in club_ranges.items():
+        try:
+            low, high = (int(bound) for bound in bounds)
+        except (TypeError, ValueError):
+            raise ValueError(f"Rango no válido para {club!r}: {bounds!r}") from None
+        if not 0 <= low <= high <= 0xFFFF:
+            raise ValueError(f"Rango no válido para {club!r}: {bounds!r}")
+        ranges[str(club)] = (low, high)
+    return ranges
+
+
+class PlayerProfileStore:
+    """
+    Perfiles de jugadores en un archivo SQLite (o solo en memoria si path es
+    None), cargados y compilados de forma perezosa. Con archivo se mantienen
+    en memoria como mucho max_loaded perfiles, descartando los usados hace
+    más tiempo, y otros tantos jugadores sin perfil. Los cambios hechos por
+    otro proceso en el mismo archivo no se ven hasta que el jugador sale de
+    memoria.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, path=None, max_loaded=100000):
+        self.path = path
+        self.max_loaded = max_loaded
+        self.clubs = ClubNames()
+        self._loaded = OrderedDict()
+        # Jugadores que no están en el archivo (búsquedas negativas)
+        self._unknown = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_loads = 0
+        self.misses = 0
+        self._conn = None
+        if path is not None:
+            self._conn = self._connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (player TEXT PRIMARY KEY, ranges TEXT NOT NULL)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def reopen(self):
+        """
+        Abre una conexión nueva al mismo archivo, para usar el almacén en un
+        proceso hijo tras un fork; los perfiles ya cargados se conservan
+        """
+        self._lock = threading.Lock()
+        self.clubs._lock = threading.Lock()
+        if self._conn is not None:
+            self._conn = self._connect()
+
+    def is_cached(self, player):
+        """True si get(player) puede responder sin consultar SQLite"""
+        return self._conn is None or player in self._loaded or player in self._unknown
+
+    def get(self, player):
+        """PlayerProfile del jugador (cargándolo del disco si hace falta), o None"""
+        with self._lock:
+            profile = self._loaded.get(player)
+            if profile is not None:
+                self._loaded.move_to_end(player)
+                self.hits += 1
+                return profile
+            if player in self._unknown:
+                self._unknown.move_to_end(player)
+                self.misses += 1
+                return None
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT ranges FROM profiles WHERE player = ?", (player,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self._conn is not None:
+                    self._unknown[player] = None
+                    if len(self._unknown) > self.max_loaded:
+                        self._unknown.popitem(last=False)
+                return None
+            self.disk_loads += 1
+            profile = PlayerProfile(_validate_ranges(json.loads(row[0])), self.clubs)
+            self._remember(player, profile)
+            return profile
+
+    def _remember(self, player, profile):
+        self._loaded[player] = profile
+        self._loaded.move_to_end(player)
+        # Sin archivo no se descarta nada: los perfiles solo están en memoria
+        while self._conn is not None and len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def set_profile(self, player, club_ranges):
+        """Guarda (en disco, si lo hay) y compila el perfil de un jugador"""
+        self.set_profiles([(player, club_ranges)])
+
+    def set_profiles(self, profiles):
+        """
+        Guarda muchos perfiles (pares jugador, rangos) en una sola transacción.
+        Los perfiles ya cargados se recompilan; el resto se carga al pedirlo.
+        """
+        rows = [(str(player), _validate_ranges(ranges)) for player, ranges in profiles]
+        with self._lock:
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO profiles VALUES (?, ?)",
+                        [(player, json.dumps(ranges)) for player, ranges in rows])
+            for player, ranges in rows:
+                self._unknown.pop(player, None)
+                if self._conn is None or player in self._loaded:
+                    self._remember(player, PlayerProfile(ranges, self.clubs))
+
+    def delete(self, player):
+        with self._lock:
+            self._loaded.pop(player, None)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM profiles WHERE player = ?", (player,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self):
+        """Perfiles guardados (en disco, o en memoria si no hay archivo)"""
+        with self._lock:
+            if self._conn is None:
+                return len(self._loaded)
+            return self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def stats(self):
+        """
+        Perfiles y jugadores desconocidos en memoria, límite y contadores de
+        aciertos, cargas y fallos
+        """
+        return {
+            "loaded": len(self._loaded),
+            "unknown": len(self._unknown),
+            "max_loaded": self.max_loaded,
+            "hits": self.hits,
+            "disk_loads": self.disk_loads,
+            "misses": self.misses,
+        }
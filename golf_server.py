@@ -0,0 +1,346 @@
+"""
+Servidor sin interfaz gráfica para el Asistente de Golf.
+
+Mantiene un único GolfAssistant con el modelo ya cargado y atiende peticiones
+en uno de estos modos:
+
+- HTTP (por defecto):  python golf_server.py --port 8000
+    POST /recommend  con {"text": "..."} o {"texts": ["...", ...]}
+    POST /chat       con {"session": "id", "text": "..."}
+    GET  /health
+    GET  /stats      estadísticas del asistente en JSON
+    GET  /metrics    las mismas estadísticas en formato de texto de Prometheus
+- JSON lines por stdin/stdout:  python golf_server.py --stdio
+    Cada línea de entrada es {"text": ...}, {"texts": [...]} o texto plano, y
+    cada línea de salida es la respuesta en JSON.
+
+Cada resultado incluye club, reason, distance, terrain, elevation, golf y message,
+además de adjusted_distance, reason_id y confidence; con "compact": true se
+omiten reason y message.
+Con "profile": true, una petición de "text" se ejecuta bajo cProfile y la
+respuesta incluye el informe en "profile". Los tiempos por etapa solo se
+registran si el servidor arranca con --metrics. Con --event-log, cada mensaje
+atendido se registra para analítica (ver golf_events) y GET /stats incluye
+los agregados en "events".
+Las peticiones con "session" siguen la conversación de esa sesión (saludo,
+despedida y recomendaciones) y devuelven session, message y close.
+
+Con --workers N (solo en sistemas con fork) el proceso padre carga el modelo
+una vez, congela sus objetos con gc.freeze() y crea N procesos hijos que
+comparten el socket de escucha y, por copia en escritura, el modelo y las
+tablas. Cada hijo informa de su memoria al arrancar y en GET /stats
+("worker"). Como el estado de las conversaciones vive en cada proceso y la
+conexión la acepta cualquier hijo, con más de un worker POST /chat responde
+501 en lugar de mezclar el estado de varias copias de la sesión.
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from golf_assistant import GolfAssistant
+from golf_metrics import memory_usage
+from golf_profiles import PlayerProfileStore
+from golf_sessions import GestorSesiones
+
+
+def handle_request(assistant, payload, sessions=None):
+    """
+    Resuelve una petición ya decodificada.
+    {"text": "..."} devuelve un resultado; {"texts": [...]} devuelve
+    {"results": [...]} procesando los textos en lote. Si incluye "session" y
+    hay gestor de sesiones, responde dentro de esa conversación. Con "player",
+    la recomendación usa el perfil de palos de ese jugador, y con "compact":
+    true los resultados se devuelven sin reason ni message (sin generar textos).
+    """
+    if isinstance(payload, str):
+        payload = {"text": payload}
+    if not isinstance(payload, dict):
+        raise ValueError("La petición debe ser un objeto JSON con 'text' o 'texts'")
+    player = payload.get("player")
+    if player is not None:
+        player = str(player)
+
+    if "session" in payload and sessions is not None:
+        if not isinstance(payload.get("text"), str):
+            raise ValueError("Las peticiones de sesión deben incluir 'text'")
+        session = str(payload["session"])
+        reply = sessions.procesar_mensaje(session, payload["text"], player)
+        return {"session": session, "message": reply.mensaje, "close": reply.cerrar}
+
+    if "texts" in payload:
+        texts = payload["texts"]
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise ValueError("'texts' debe ser una lista de cadenas")
+        text = not payload.get("compact")
+        return {"results": [result.to_dict(text)
+                            for result in assistant.evaluate_batch(texts, player=player)]}
+    if isinstance(payload.get("text"), str):
+        if payload.get("profile"):
+            result, report = assistant.profile(payload["text"])
+            return {**result, "profile": report}
+        return assistant.evaluate(payload["text"], player).to_dict(not payload.get("compact"))
+    raise ValueError("La petición debe incluir 'text' o 'texts'")
+
+
+class GolfRequestHandler(BaseHTTPRequestHandler):
+    """Manejador HTTP; el asistente compartido está en self.server.assistant"""
+
+    server_version = "GolfAssistant/1.0"
+    protocol_version = "HTTP/1.1"
+    # Con conexiones persistentes, Nagle retrasa el cuerpo tras las cabeceras
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.assistant.load_stats,
+                                  "sessions": self._session_stats()})
+        elif self.path == "/stats":
+            stats = {**self.server.assistant.stats(), "sessions": self._session_stats()}
+            if self.server.worker is not None:
+                stats["worker"] = {**self.server.worker, "memory": memory_usage()}
+            self._send_json(200, stats)
+        elif self.path == "/metrics":
+            body = self.server.assistant.prometheus_text().encode("utf-8")
+            self._send(200, body, "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if self.path not in ("/recommend", "/chat"):
+            self._send_json(404, {"error": "Ruta no encontrada"})
+            return
+        if self.path == "/chat" and self.server.sessions is None:
+            self._send_json(501, {"error": "/chat no está disponible con más de un worker: "
+                                           "cada proceso tendría su propia copia de la sesión"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError("Content-Length no puede ser negativo")
+            payload = json.loads(self.rfile.read(length) or b"null")
+            if self.path == "/chat" and not (isinstance(payload, dict) and "session" in payload):
+                raise ValueError("Las peticiones a /chat deben incluir 'session'")
+            result = handle_request(self.server.assistant, payload, self.server.sessions)
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            # Cualquier otro fallo (p. ej. ModelNotFoundError) también recibe respuesta
+            traceback.print_exc()
+            self._send_json(500, {"error": f"Error interno: {e}"})
+            return
+        self._send_json(200, result)
+
+    def _session_stats(self):
+        sessions = self.server.sessions
+        return sessions.stats() if sessions is not None else None
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(assistant, host="127.0.0.1", port=8000, verbose=False):
+    """Crea el servidor HTTP (sin arrancarlo) compartiendo un asistente ya cargado"""
+    server = ThreadingHTTPServer((host, port), GolfRequestHandler)
+    server.daemon_threads = True
+    server.assistant = assistant
+    server.sessions = GestorSesiones(assistant)
+    server.verbose = verbose
+    # Datos del proceso hijo que atiende (solo con serve_prefork)
+    server.worker = None
+    return server
+
+
+# Mensajes con los que se calienta el modelo en el padre antes del fork, para
+# que lo que Spacy reserva en el primer uso también quede compartido
+WARM_UP_MESSAGES = [
+    "estoy a 150 yardas del hoyo en el fairway",
+    "la bola quedó en el bunker a ciento veinte metros cuesta arriba",
+    "tengo 90 yardas hasta el green con viento en contra",
+]
+
+
+def _format_memory(usage):
+    if not usage:
+        return "memoria no disponible"
+    return ", ".join(f"{name[:-3]} {usage[name] / 1024:.1f} MB"
+                     for name in ("rss_kb", "pss_kb", "shared_kb", "private_kb"))
+
+
+def serve_prefork(assistant, server, workers, stderr=sys.stderr):
+    """
+    Atiende server con `workers` procesos hijos creados con fork después de
+    cargar y calentar el modelo, de modo que todos comparten sus páginas con
+    el padre. gc.freeze() saca esos objetos de las pasadas del recolector,
+    que si no las tocaría y forzaría su copia en cada hijo. El padre solo
+    vigila a los hijos y vuelve a crear los que terminen inesperadamente.
+    """
+    # analyze no deja eventos en el registro
+    for text in WARM_UP_MESSAGES:
+        assistant.analyze(text)
+    if assistant.disk_cache is not None:
+        assistant.disk_cache.flush()
+    if assistant.event_log is not None:
+        assistant.event_log.flush()
+    print(f"Padre {os.getpid()} antes del fork: {_format_memory(memory_usage())}", file=stderr)
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(assistant, server, slot, stderr, workers)
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Padre e hijos terminan con SIGTERM igual que con Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(workers):
+        spawn(slot)
+    try:
+        while children:
+            pid, status = os.wait()
+            slot = children.pop(pid, None)
+            if slot is None:
+                continue
+            print(f"El worker {slot} (pid {pid}) terminó con estado {status}; se reinicia",
+                  file=stderr)
+            # Evita crear hijos en bucle si fallan nada más arrancar
+            time.sleep(1)
+            spawn(slot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def _run_worker(assistant, server, slot, stderr, workers=1):
+    """Cuerpo de un proceso hijo de serve_prefork"""
+    assistant.after_fork()
+    # Con varios hijos una sesión acabaría repartida entre procesos: sin /chat
+    server.sessions = GestorSesiones(assistant) if workers == 1 else None
+    server.worker = {"slot": slot, "pid": os.getpid(), "memory_at_start": memory_usage()}
+    print(f"Worker {slot} (pid {os.getpid()}) al arrancar: "
+          f"{_format_memory(server.worker['memory_at_start'])}", file=stderr)
+    try:
+        server.serve_forever()
+    finally:
+        # Vuelca la caché en disco propia del hijo antes de salir
+        assistant.close()
+        print(f"Worker {slot} (pid {os.getpid()}) al terminar: {_format_memory(memory_usage())}",
+              file=stderr)
+
+
+def serve_stdio(assistant, stdin=sys.stdin, stdout=sys.stdout):
+    """Atiende peticiones JSON lines por stdin y escribe cada respuesta en stdout"""
+    sessions = GestorSesiones(assistant)
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = json.loads(line) if line.startswith("{") else line
+            result = handle_request(assistant, payload, sessions)
+        except ValueError as e:
+            result = {"error": str(e)}
+        stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+
+def main(argv=None):
+    """Punto de entrada del servidor sin interfaz gráfica"""
+    parser = argparse.ArgumentParser(description="Servidor del Asistente de Golf")
+    parser.add_argument("--stdio", action="store_true",
+                        help="atender JSON lines por stdin/stdout en lugar de HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", default="fast", help="modo de carga del modelo (fast, parser, full)")
+    parser.add_argument("--model-dir", default=None, help="carpeta local con el modelo o su wheel")
+    parser.add_argument("--verbose", action="store_true", help="registrar cada petición HTTP")
+    parser.add_argument("--tables", default=None,
+                        help="archivo JSON con los rangos de los palos y los léxicos "
+                             "(se recarga en caliente al cambiar)")
+    parser.add_argument("--disk-cache", default=None,
+                        help="archivo SQLite donde persistir las características analizadas")
+    parser.add_argument("--metrics", action="store_true",
+                        help="registrar los tiempos de cada etapa del análisis")
+    parser.add_argument("--profiles", default=None,
+                        help="archivo SQLite con los perfiles de palos de los jugadores")
+    parser.add_argument("--event-log", default=None,
+                        help="archivo JSON lines donde registrar cada mensaje atendido")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="procesos hijos que comparten el modelo cargado (0: un solo proceso)")
+    args = parser.parse_args(argv)
+
+    # Cargar el modelo antes de aceptar peticiones para mantenerlo caliente
+    profiles = PlayerProfileStore(args.profiles) if args.profiles else None
+    assistant = GolfAssistant(mode=args.mode, model_dir=args.model_dir, metrics=args.metrics,
+                              disk_cache=args.disk_cache, tables_file=args.tables,
+                              profiles=profiles, event_log=args.event_log)
+    stats = assistant.load()
+    print(f"Modelo cargado en {stats['load_seconds']:.2f} s ({', '.join(stats['components'])})",
+          file=sys.stderr)
+
+    if args.stdio:
+        serve_stdio(assistant)
+        return
+
+    server = create_server(assistant, args.host, args.port, args.verbose)
+    print(f"Escuchando en http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        if args.workers > 0:
+            serve_prefork(assistant, server, args.workers)
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        assistant.close()
+        if profiles is not None:
+            profiles.close()
+
+
+if __name__ == "__main__":
+    main()
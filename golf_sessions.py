@@ -0,0 +1,222 @@
+"""
+Estado de conversación por sesión para el Asistente de Golf.
+
+Cada conversación (una ventana del chat, un cliente del servidor...) se
+identifica con un id de sesión. El gestor guarda un registro compacto por
+sesión, caduca las sesiones inactivas y limita cuántas hay en memoria, de modo
+que un solo proceso puede atender miles de conversaciones con un mismo
+GolfAssistant.
+
+Cada mensaje se clasifica primero con un enrutador de intenciones compilado
+(despedida, salida, saludo, comercio o golf) y solo los mensajes de golf llegan
+al análisis con Spacy.
+"""
+
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, namedtuple
+
+from golf_assistant import OFF_TOPIC_RESPONSE, GolfAssistant, KeywordAutomaton
+
+# Respuesta a un mensaje: el texto para el usuario y si hay que cerrar la conversación
+RespuestaChat = namedtuple("RespuestaChat", ["mensaje", "cerrar"])
+
+DESPEDIDAS = ['salir', 'adiós', 'adios', 'chao', 'hasta luego', 'gracias', 'bye']
+SALIDAS = ['salir', 'chao', 'bye']
+SALUDOS = ['hola', 'buenos días', 'buenas tardes', 'buenas noches', 'hey', 'holi']
+
+MENSAJE_DESPEDIDA = "¡Hasta luego! Que tengas un excelente juego. ¡Swing fácil! 🏌️‍♂️"
+MENSAJE_SALUDO = (
+    "¡Hola! Soy tu asistente de golf personal. Estoy aquí para ayudarte a elegir "
+    "el palo adecuado para tu siguiente golpe.\n\nPuedes decirme cosas como:\n"
+    "• 'Estoy a 150 yardas del hoyo en el fairway'\n"
+    "• 'Tengo 90 yardas hasta el green con viento en contra'\n"
+    "• 'Estoy en el rough a 120 yardas'"
+)
+MENSAJE_PEDIR_SALUDO = "¡Hola! Soy tu asistente de golf. Por favor, saludame y cuentame que necesitas. 😊"
+
+# Intenciones que distingue el enrutador
+INTENCION_SALIDA = "salida"
+INTENCION_DESPEDIDA = "despedida"
+INTENCION_SALUDO = "saludo"
+INTENCION_SIN_SALUDO = "sin_saludo"
+INTENCION_COMERCIO = "comercio"
+INTENCION_GOLF = "golf"
+
+# Signos que separan palabras igual que un espacio, para reconocer el principio
+# de palabra en "¿precio?" o "(venta)"
+_SEPARADORES = str.maketrans({signo: " " for signo in "¿?¡!.,;:()\"'"})
+
+
+class EnrutadorIntenciones:
+    """
+    Clasifica un mensaje en minúsculas con una sola pasada de un autómata
+    precompilado sobre todas las palabras clave (despedidas, salidas, saludos y
+    términos de comercio y de golf del asistente), como subcadenas del texto.
+    Los términos de comercio solo cuentan al principio de una palabra.
+    """
+
+    def __init__(self, golf_terms, commerce_terms):
+        palabras = [(palabra, INTENCION_DESPEDIDA) for palabra in DESPEDIDAS]
+        palabras += [(palabra, INTENCION_SALIDA) for palabra in SALIDAS]
+        palabras += [(palabra, INTENCION_SALUDO) for palabra in SALUDOS]
+        palabras += [(" " + termino, INTENCION_COMERCIO) for termino in commerce_terms]
+        palabras += [(termino, INTENCION_GOLF) for termino in golf_terms]
+        self._automata = KeywordAutomaton(palabras)
+
+    def clasificar(self, mensaje, saludado=True):
+        """
+        Devuelve la intención del mensaje, por orden de prioridad:
+        - salida o despedida, si contiene alguna despedida
+        - saludo o sin_saludo, si la conversación aún no ha sido saludada
+        - comercio, si habla de compras y no menciona ningún término de golf
+        - golf en cualquier otro caso
+        """
+        etiquetas = self._automata.find(" " + mensaje.translate(_SEPARADORES))
+        if INTENCION_DESPEDIDA in etiquetas:
+            return INTENCION_SALIDA if INTENCION_SALIDA in etiquetas else INTENCION_DESPEDIDA
+        if not saludado:
+            return INTENCION_SALUDO if INTENCION_SALUDO in etiquetas else INTENCION_SIN_SALUDO
+        if INTENCION_COMERCIO in etiquetas and INTENCION_GOLF not in etiquetas:
+            return INTENCION_COMERCIO
+        return INTENCION_GOLF
+
+
+class SesionChat:
+    """Registro compacto del estado de una conversación"""
+
+    __slots__ = ("id", "saludado", "ultimo_uso", "mensajes")
+
+    def __init__(self, id_sesion, ahora):
+        self.id = id_sesion
+        self.saludado = False
+        self.ultimo_uso = ahora
+        self.mensajes = 0
+
+
+class GestorSesiones:
+    """
+    Sesiones de chat indexadas por id, en orden de uso reciente.
+    Las sesiones sin actividad durante más de `inactividad` segundos caducan
+    (nunca, con inactividad=None) y, si se supera `max_sesiones`, se descartan
+    las usadas hace más tiempo.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, assistant, max_sesiones=10000, inactividad=1800, clock=time.monotonic):
+        self.assistant = assistant
+        self.max_sesiones = max_sesiones
+        self.inactividad = inactividad
+        self._clock = clock
+        # El enrutador se reconstruye si el asistente recarga sus tablas
+        self._tablas = assistant.tables
+        self.enrutador = EnrutadorIntenciones(self._tablas.golf_terms, self._tablas.commerce_terms)
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+        self.caducadas = 0
+        self.descartadas = 0
+
+    def obtener(self, id_sesion):
+        """Devuelve la sesión (creándola si no existe o si había caducado)"""
+        ahora = self._clock()
+        with self._lock:
+            self._purgar(ahora)
+            sesion = self._sesiones.get(id_sesion)
+            if sesion is None:
+                sesion = SesionChat(id_sesion, ahora)
+                self._sesiones[id_sesion] = sesion
+                while len(self._sesiones) > self.max_sesiones:
+                    self._sesiones.popitem(last=False)
+                    self.descartadas += 1
+            else:
+                sesion.ultimo_uso = ahora
+                self._sesiones.move_to_end(id_sesion)
+            return sesion
+
+    def _purgar(self, ahora):
+        if self.inactividad is None:
+            return
+        # Las sesiones están ordenadas por último uso: las caducadas van al principio
+        limite = ahora - self.inactividad
+        while self._sesiones:
+            sesion = next(iter(self._sesiones.values()))
+            if sesion.ultimo_uso > limite:
+                break
+            self._sesiones.popitem(last=False)
+            self.caducadas += 1
+
+    def cerrar(self, id_sesion):
+        """Elimina la sesión indicada si existe"""
+        with self._lock:
+            self._sesiones.pop(id_sesion, None)
+
+    def procesar_mensaje(self, id_sesion, mensaje, jugador=None):
+        """
+        Responde a un mensaje dentro de su conversación: despedidas, saludo
+        inicial y, una vez saludado, recomendaciones del asistente de golf.
+        Solo la intención de golf llega al asistente, con el perfil de palos de
+        `jugador` si se indica. Devuelve una RespuestaChat.
+        """
+        sesion = self.obtener(id_sesion)
+        sesion.mensajes += 1
+        mensaje = mensaje.lower()
+        tablas = self.assistant.tables
+        if tablas is not self._tablas:
+            self._tablas = tablas
+            self.enrutador = EnrutadorIntenciones(tablas.golf_terms, tablas.commerce_terms)
+        intencion = self.enrutador.clasificar(mensaje, sesion.saludado)
+        # Los mensajes de golf los registra el asistente; el resto, aquí
+        if intencion != INTENCION_GOLF and self.assistant.event_log is not None:
+            self.assistant.event_log.record(mensaje, intent=intencion, player=jugador)
+
+        # Comandos de salida
+        if intencion == INTENCION_SALIDA:
+            self.cerrar(id_sesion)
+            return RespuestaChat(MENSAJE_DESPEDIDA, True)
+        if intencion == INTENCION_DESPEDIDA:
+            return RespuestaChat(MENSAJE_DESPEDIDA, False)
+
+        # Si es un saludo inicial
+        if intencion == INTENCION_SALUDO:
+            sesion.saludado = True
+            return RespuestaChat(MENSAJE_SALUDO, False)
+        if intencion == INTENCION_SIN_SALUDO:
+            return RespuestaChat(MENSAJE_PEDIR_SALUDO, False)
+
+        # Mensajes de compra o venta: se responden sin analizarlos
+        if intencion == INTENCION_COMERCIO:
+            return RespuestaChat(OFF_TOPIC_RESPONSE, False)
+
+        # Procesar la entrada con el asistente de golf
+        return RespuestaChat(self.assistant.process_input(mensaje, jugador), False)
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def stats(self):
+        """Sesiones activas, límites y contadores de caducadas y descartadas"""
+        return {
+            "sesiones": len(self._sesiones),
+            "max_sesiones": self.max_sesiones,
+            "inactividad": self.inactividad,
+            "caducadas": self.caducadas,
+            "descartadas": self.descartadas,
+        }
+
+
+def medir_memoria_por_sesion(n=10000):
+    """
+    Mide con tracemalloc la memoria que ocupa cada sesión en el gestor
+    (registro, id y entrada del índice). Devuelve los bytes por sesión.
+    """
+    gestor = GestorSesiones(GolfAssistant(), max_sesiones=n)
+    tracemalloc.start()
+    try:
+        antes = tracemalloc.get_traced_memory()[0]
+        for i in range(n):
+            gestor.obtener(f"sesion-{i}")
+        despues = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (despues - antes) / n
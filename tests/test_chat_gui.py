@@ -0,0 +1,118 @@
+"""Pruebas de la cola de actualizaciones de ChatNicoGUI, sin pantalla"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ChatLTyPOS import ChatNicoGUI  # noqa: E402
+from golf_sessions import RespuestaChat  # noqa: E402
+
+
+class RaizFalsa:
+    """Sustituye a tk.Tk: guarda lo programado con after y lo ejecuta a mano"""
+
+    def __init__(self):
+        self.programadas = []
+
+    def after(self, ms, funcion):
+        self.programadas.append(funcion)
+        return len(self.programadas)
+
+    def ejecutar(self):
+        """Una vuelta del bucle de eventos; devuelve cuánto tardó cada callback"""
+        funciones, self.programadas = self.programadas, []
+        tiempos = []
+        for funcion in funciones:
+            inicio = time.perf_counter()
+            try:
+                funcion()
+            except Exception:
+                pass  # Tk informa del error y sigue con el bucle
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+
+class SesionesLentas:
+    """Sustituye a GestorSesiones: cada respuesta tarda `retardo` segundos"""
+
+    def __init__(self, retardo):
+        self.retardo = retardo
+
+    def procesar_mensaje(self, id_sesion, mensaje):
+        time.sleep(self.retardo)
+        return RespuestaChat(f"respuesta a {mensaje}", False)
+
+
+class VistaPreviaFalsa:
+    version = 0
+
+
+def crear_gui(retardo=0.0):
+    """ChatNicoGUI sin ventana: solo la cola, el hilo de trabajo y widgets falsos"""
+    gui = ChatNicoGUI.__new__(ChatNicoGUI)
+    gui.cola_ui = queue.Queue()
+    gui.root = RaizFalsa()
+    gui.executor = ThreadPoolExecutor(max_workers=1)
+    gui.sesiones = SesionesLentas(retardo)
+    gui.vista_previa = VistaPreviaFalsa()
+    gui.lotes = []
+    gui.estados = []
+    gui.hilo_principal = threading.get_ident()
+
+    def agregar_mensajes(lote):
+        assert threading.get_ident() == gui.hilo_principal
+        gui.lotes.append(lote)
+
+    def actualizar_status(texto):
+        assert threading.get_ident() == gui.hilo_principal
+        gui.estados.append(texto)
+
+    gui.agregar_mensajes = agregar_mensajes
+    gui.actualizar_status = actualizar_status
+    return gui
+
+
+@pytest.fixture
+def gui():
+    gui = crear_gui(retardo=0.001)
+    yield gui
+    gui.executor.shutdown(wait=True)
+
+
+def test_event_loop_stays_responsive_with_messages_in_flight(gui):
+    n = 200
+    trabajos = [gui.executor.submit(gui.procesar_mensaje, f"mensaje {i}") for i in range(n)]
+    gui.root.after(0, gui.drenar_cola_ui)
+
+    tiempos = []
+    while not all(trabajo.done() for trabajo in trabajos):
+        tiempos += gui.root.ejecutar()
+        time.sleep(0.005)
+    tiempos += gui.root.ejecutar()
+
+    # Cada vuelta del bucle es corta aunque haya mensajes en curso
+    assert max(tiempos) < 0.05
+    # Todas las respuestas llegan, en orden y agrupadas en menos pasadas
+    pintados = [mensaje for lote in gui.lotes for mensaje, _, _ in lote]
+    assert pintados == [f"respuesta a mensaje {i}" for i in range(n)]
+    assert len(gui.lotes) < n
+    # El drenado sigue programado
+    assert gui.root.programadas == [gui.drenar_cola_ui]
+
+
+def test_drain_reschedules_after_widget_error(gui):
+    def falla(lote):
+        raise RuntimeError("TclError simulado")
+
+    gui.agregar_mensajes = falla
+    gui.publicar_mensaje("hola")
+    gui.root.after(0, gui.drenar_cola_ui)
+    gui.root.ejecutar()
+    assert gui.root.programadas == [gui.drenar_cola_ui]
@@ -0,0 +1,273 @@
+"""Pruebas del Asistente de Golf"""
+
+import asyncio
+import os
+import random
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golf_assistant import (  # noqa: E402
+    OFF_TOPIC_RESULT,
+    GolfAssistant,
+    ModelNotFoundError,
+    build_blank_pipeline,
+    lexicon_words,
+)
+from golf_profiles import PlayerProfileStore  # noqa: E402
+
+# Mensaje que el camino rápido no acepta (necesita Spacy) y otro que sí
+NLP_MESSAGE = "la bola quedó en el bunker a ciento veinte metros cuesta arriba"
+FAST_MESSAGE = "estoy a 150 yardas en el fairway"
+
+
+class ContadorLlamadas:
+    """Envuelve el pipeline de Spacy y cuenta cuántas veces se llama"""
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.llamadas = 0
+
+    def __call__(self, text, *args, **kwargs):
+        self.llamadas += 1
+        return self.nlp(text, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.nlp, name)
+
+
+@pytest.fixture(scope="module")
+def nlp():
+    try:
+        assistant = GolfAssistant()
+        assistant.load()
+    except ModelNotFoundError as e:
+        pytest.skip(f"Modelo de Spacy no disponible: {e}")
+    return assistant.nlp
+
+
+@pytest.fixture
+def assistant(nlp):
+    # Sin cachés, para que cada mensaje se analice de verdad
+    assistant = GolfAssistant(cache_size=0)
+    assistant._nlp = ContadorLlamadas(nlp)
+    yield assistant
+    assistant.close()
+
+
+def test_spacy_runs_once_per_message(assistant):
+    for expected in range(1, 4):
+        assistant.process_input(NLP_MESSAGE)
+        assert assistant._nlp.llamadas == expected
+
+
+def test_fast_path_skips_spacy(assistant):
+    response = assistant.process_input(FAST_MESSAGE)
+    assert assistant._nlp.llamadas == 0
+    assert response.result.club is not None
+
+
+@pytest.mark.parametrize("message", ["cuál es el costo", "quiero pesos algo", "pago con dinero"])
+def test_blank_pipeline_keeps_commerce_terms(message):
+    assistant = GolfAssistant(cache_size=0, fast_path=False)
+    assistant._nlp = build_blank_pipeline(lexicon_words(assistant.tables))
+    try:
+        assert assistant.process_input(message).result is OFF_TOPIC_RESULT
+    finally:
+        assistant.close()
+
+
+class LecturasDeTablas:
+    """Envuelve un TableStore y cuenta cuántas veces se leen sus tablas"""
+
+    def __init__(self, store):
+        self.store = store
+        self.lecturas = 0
+
+    @property
+    def tables(self):
+        self.lecturas += 1
+        return self.store.tables
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def test_request_reads_tables_once():
+    assistant = GolfAssistant(cache_size=0)
+    assistant.table_store = LecturasDeTablas(assistant.table_store)
+    try:
+        for expected in range(1, 4):
+            result = assistant.evaluate(FAST_MESSAGE)
+            assert result.club is not None
+            assert assistant.table_store.lecturas == expected
+    finally:
+        assistant.close()
+
+
+@pytest.mark.parametrize("message", ["estoy a 100 m", "estoy a 100 m.", "la bola quedó a 100 m."])
+def test_metre_abbreviation_with_period(nlp, message):
+    assistant = GolfAssistant(cache_size=0)
+    assistant._nlp = nlp
+    try:
+        assert assistant.evaluate(message).distance == 109
+    finally:
+        assistant.close()
+
+
+def test_preview_leaves_caches_and_counters_alone():
+    assistant = GolfAssistant()
+    words = FAST_MESSAGE.split()
+    try:
+        for i in range(1, len(words) + 1):
+            assert assistant.preview(" ".join(words[:i])) is not None
+        assert len(assistant.feature_cache) == 0
+        assert len(assistant.recommendation_cache) == 0
+        assert assistant.fast_path_stats()["hits"] == 0
+        assert assistant.cache_stats()["features"]["misses"] == 0
+
+        # El mensaje enviado sí se guarda, y la vista previa lo reutiliza
+        sent = assistant.evaluate(FAST_MESSAGE)
+        assert assistant.preview(FAST_MESSAGE) is sent
+        assert assistant.cache_stats()["features"]["hits"] == 0
+    finally:
+        assistant.close()
+
+
+def test_disk_cache_is_read_off_the_event_loop(tmp_path):
+    assistant = GolfAssistant(disk_cache=str(tmp_path / "features.sqlite"))
+    key = "|".join((assistant.tables.tag, NLP_MESSAGE))
+    assistant.disk_cache.put(key, (True, 131, "bunker", "subida"))
+    hilos = []
+    get = assistant.disk_cache.get
+
+    def get_registrando(*args, **kwargs):
+        hilos.append(threading.current_thread().name)
+        return get(*args, **kwargs)
+
+    assistant.disk_cache.get = get_registrando
+    try:
+        response = asyncio.run(assistant.aprocess_input(NLP_MESSAGE))
+        assert response.result.distance == 131
+        assert hilos and all(nombre.startswith("golf-nlp") for nombre in hilos)
+
+        # La vista previa rápida tampoco consulta el disco
+        del hilos[:]
+        assistant.feature_cache.clear()
+        assert assistant.preview(NLP_MESSAGE) is None
+        assert hilos == []
+    finally:
+        assistant.close()
+
+
+def test_profiles_are_loaded_off_the_event_loop(tmp_path):
+    profiles = PlayerProfileStore(str(tmp_path / "profiles.sqlite"))
+    profiles.set_profile("ana", {"Hierro 7": (140, 160), "Driver": (161, 300)})
+    profiles = PlayerProfileStore(profiles.path)
+    assistant = GolfAssistant(profiles=profiles)
+    hilos = []
+    conn = profiles._conn
+
+    class ConexionRegistrando:
+        def execute(self, *args):
+            hilos.append(threading.current_thread().name)
+            return conn.execute(*args)
+
+    profiles._conn = ConexionRegistrando()
+    try:
+        for player in ("ana", "nadie", "ana", "nadie"):
+            response = asyncio.run(assistant.aprocess_input(FAST_MESSAGE, player=player))
+            assert response.result.club is not None
+        # Una consulta por jugador, en el pool; los desconocidos también se recuerdan
+        assert len(hilos) == 2 and all(nombre.startswith("golf-nlp") for nombre in hilos)
+        assert profiles.get("nadie") is None and len(hilos) == 2
+    finally:
+        profiles._conn = conn
+        assistant.close()
+        profiles.close()
+
+
+def test_request_stage_covers_every_entry_point(nlp):
+    assistant = GolfAssistant(metrics=True)
+    assistant._nlp = nlp
+    try:
+        assistant.evaluate(FAST_MESSAGE)
+        list(assistant.evaluate_batch([FAST_MESSAGE, FAST_MESSAGE]))
+        asyncio.run(assistant.aprocess_input(FAST_MESSAGE))
+        assistant.preview(FAST_MESSAGE)
+        stages = assistant.metrics.stats()["stages"]
+        assert stages["request"]["count"] == 4
+        assert stages["analyze"]["count"] == 1
+        assert stages["preview"]["count"] == 1
+    finally:
+        assistant.close()
+
+
+def test_huge_distance_does_not_break_the_disk_cache(nlp, tmp_path):
+    assistant = GolfAssistant(disk_cache=str(tmp_path / "features.sqlite"))
+    assistant._nlp = nlp
+    assistant.disk_cache.write_batch = 1
+    try:
+        assistant.process_input("la bola quedó a 99999999999999999999 yardas")
+        assert assistant.process_input(NLP_MESSAGE).result.club is not None
+        assert assistant.cache_stats()["disk"]["write_errors"] == 0
+    finally:
+        assistant.close()
+
+
+def test_warm_batch_does_not_load_spacy(nlp, tmp_path):
+    path = str(tmp_path / "features.sqlite")
+    cold = GolfAssistant(disk_cache=path)
+    cold._nlp = nlp
+    list(cold.evaluate_batch([NLP_MESSAGE]))
+    cold.close()
+
+    warm = GolfAssistant(disk_cache=path)
+    try:
+        results = list(warm.evaluate_batch([FAST_MESSAGE, NLP_MESSAGE, FAST_MESSAGE]))
+        assert all(result.club is not None for result in results)
+        assert warm._nlp is None
+    finally:
+        warm.close()
+
+
+def test_batch_keeps_order_around_spacy_messages(assistant):
+    texts = [FAST_MESSAGE, NLP_MESSAGE, FAST_MESSAGE, NLP_MESSAGE.upper(), "hola"]
+    batch = list(assistant.process_batch(texts))
+    assert batch == [assistant.process_input(text) for text in texts]
+
+
+def shots(n, seed=0):
+    rng = random.Random(seed)
+    terrains = ["fairway", "rough", "bunker", "tee", "green", "desconocido"]
+    return [(rng.choice([rng.randint(0, 330), rng.randint(0, 330) + 0.5]), rng.choice(terrains),
+             rng.choice(("subida", "bajada", "plano"))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("player", [None, "ana"])
+def test_vectorized_choose_clubs_matches_choose_club(player):
+    profiles = PlayerProfileStore()
+    profiles.set_profile("ana", {"Driver": (200, 300), "Hierro 7": (140, 160),
+                                 "Sand Wedge": (0, 60)})
+    assistant = GolfAssistant(profiles=profiles)
+    try:
+        batch = shots(5000)
+        distances, terrains, elevations = zip(*batch)
+        expected = [assistant.choose_club(*shot, player=player) for shot in batch]
+
+        results = assistant.choose_clubs(distances, terrains, elevations, player, results=True)
+        assert [repr(result) for result in results] == [repr(result) for result in expected]
+
+        choices = assistant.choose_clubs(np.array(distances), np.array(terrains),
+                                         np.array(elevations), player)
+        assert choices.club.tolist() == [result.club for result in expected]
+        assert choices.reason_id.tolist() == [result.reason_id for result in expected]
+        assert choices.confidence.tolist() == [result.confidence for result in expected]
+        assert choices.adjusted_distance.tolist() == [result.adjusted_distance
+                                                      for result in expected]
+    finally:
+        assistant.close()
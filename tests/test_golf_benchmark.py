@@ -0,0 +1,35 @@
+"""Pruebas de la comparación de resultados del banco de pruebas"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golf_benchmark import compare_results  # noqa: E402
+
+
+def informe(quick=True, **results):
+    return {"meta": {"corpus_size": 1000, "quick": quick}, "results": results}
+
+
+BASE = informe(latency={"p50_ms": 1.0}, batch={"messages_per_s": 100.0},
+               preview={"reused_prefix_rate": 0.5}, profiles={"players": 1000})
+
+
+def test_slower_and_lower_throughput_are_regressions():
+    current = informe(latency={"p50_ms": 2.0}, batch={"messages_per_s": 50.0},
+                      preview={"reused_prefix_rate": 0.5}, profiles={"players": 1000})
+    names = [name for name, _, _, _ in compare_results(current, BASE)]
+    assert names == ["latency.p50_ms", "batch.messages_per_s"]
+
+
+def test_improvements_and_configuration_counts_are_not_regressions():
+    current = informe(latency={"p50_ms": 0.5}, batch={"messages_per_s": 200.0},
+                      preview={"reused_prefix_rate": 0.9}, profiles={"players": 50000})
+    assert compare_results(current, BASE) == []
+
+
+def test_runs_with_different_sizes_are_not_compared():
+    current = informe(quick=False, latency={"p50_ms": 10.0}, batch={"messages_per_s": 1.0},
+                      preview={"reused_prefix_rate": 0.5}, profiles={"players": 1000})
+    assert compare_results(current, BASE) == []
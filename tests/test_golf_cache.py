@@ -0,0 +1,33 @@
+"""Pruebas de la caché en disco de características"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golf_cache import DiskFeatureCache  # noqa: E402
+
+
+def test_out_of_range_distance_is_not_cached(tmp_path):
+    cache = DiskFeatureCache(str(tmp_path / "features.sqlite"), write_batch=1)
+    cache.put("enorme", (True, 99999999999999999999, "desconocido", "plano"))
+    cache.put("normal", (True, 150, "fairway", "plano"))
+    assert cache.get("enorme") is None
+    assert cache.get("normal") == (True, 150, "fairway", "plano")
+    assert cache.stats()["write_errors"] == 0
+    cache.close()
+
+
+def test_failed_flush_drops_the_batch_and_keeps_working(tmp_path):
+    cache = DiskFeatureCache(str(tmp_path / "features.sqlite"), write_batch=2)
+    cache.put("malo", (True, 150, object(), "plano"))
+    cache.put("bueno", (True, 150, "fairway", "plano"))
+    stats = cache.stats()
+    assert stats["write_errors"] == 1 and stats["last_error"]
+    assert stats["pending"] == 0
+
+    cache.put("otro", (True, 120, "rough", "subida"))
+    cache.put("más", (True, 90, "green", "bajada"))
+    assert cache.stats()["write_errors"] == 1
+    assert cache.get("otro") == (True, 120, "rough", "subida")
+    cache.close()
@@ -0,0 +1,62 @@
+"""Pruebas del servidor HTTP del Asistente de Golf"""
+
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golf_assistant import GolfAssistant, ModelNotFoundError  # noqa: E402
+from golf_server import create_server  # noqa: E402
+
+
+class AsistenteSinModelo(GolfAssistant):
+    """GolfAssistant cuya evaluación falla como si faltara el modelo"""
+
+    def evaluate(self, text, player=None):
+        raise ModelNotFoundError("No se encontró el modelo de Spacy")
+
+
+@pytest.fixture
+def server():
+    server = create_server(AsistenteSinModelo(), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, headers, path="/recommend"):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        conn.request("POST", path, body, headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def test_negative_content_length_is_rejected(server):
+    status, data = post(server, b"", {"Content-Length": "-1"})
+    assert status == 400
+    assert "Content-Length" in data["error"]
+
+
+def test_unexpected_errors_get_a_json_500(server):
+    status, data = post(server, json.dumps({"text": "estoy a 150 yardas"}),
+                        {"Content-Type": "application/json"})
+    assert status == 500
+    assert "modelo" in data["error"]
+
+
+def test_chat_is_refused_without_shared_sessions(server):
+    # Así queda cada hijo de serve_prefork con más de un worker
+    server.sessions = None
+    status, data = post(server, json.dumps({"session": "s1", "text": "hola"}), {}, "/chat")
+    assert status == 501
+    assert "worker" in data["error"]
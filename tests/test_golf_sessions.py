@@ -0,0 +1,37 @@
+"""Pruebas del gestor de sesiones de chat"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from golf_assistant import GolfAssistant  # noqa: E402
+from golf_sessions import MENSAJE_PEDIR_SALUDO, GestorSesiones  # noqa: E402
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def conversar(inactividad):
+    reloj = Reloj()
+    gestor = GestorSesiones(GolfAssistant(), inactividad=inactividad, clock=reloj)
+    gestor.procesar_mensaje("local", "hola")
+    reloj.ahora += 86400
+    return gestor, gestor.procesar_mensaje("local", "estoy a 150 yardas en el fairway")
+
+
+def test_idle_sessions_expire():
+    gestor, respuesta = conversar(1800)
+    assert respuesta.mensaje == MENSAJE_PEDIR_SALUDO
+    assert gestor.caducadas == 1
+
+
+def test_sessions_without_expiry_stay_greeted():
+    gestor, respuesta = conversar(None)
+    assert respuesta.mensaje.startswith("Recomendación:")
+    assert gestor.caducadas == 0